@@ -0,0 +1,478 @@
+"""
+WEEK 9: BENCHMARK SUITE FOR THE ASYNC FETCH HELPERS
+Reproducible throughput and latency numbers without touching the network
+
+A local aiohttp test server (in its own process, so it doesn't compete
+with the client for the event loop) answers with a configurable latency
+distribution, injected 429 / 5xx errors and a fixed payload size. Each
+benchmark drives one helper from week9_python_examples at a target
+concurrency and reports requests per second, p50/p99 latency and memory.
+Results are saved as JSON so runs can be compared across versions.
+
+Usage:
+python week9_benchmark_suite.py                          # Run everything
+python week9_benchmark_suite.py --only fetch_url cache   # Some benchmarks
+python week9_benchmark_suite.py --requests 5000 --concurrency 200
+python week9_benchmark_suite.py --latency lognormal:0.02:0.5 --error-rate 0.05
+python week9_benchmark_suite.py --error-rate 0.05 --adaptive   # Report adaptive limits
+python week9_benchmark_suite.py --output new.json --compare old.json
+
+# A/B the event loop on real HTTP traffic
+python week9_benchmark_suite.py --loop asyncio --output asyncio.json
+python week9_benchmark_suite.py --loop uvloop --compare asyncio.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Callable, Awaitable
+
+import aiohttp
+from aiohttp import web
+
+import week9_python_examples as examples
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# ============================================================================
+# SECTION 1: THE LOCAL TEST SERVER
+# ============================================================================
+
+"""
+Latency distributions are given as "name:parameters" (seconds):
+
+none                     - answer immediately
+fixed:0.01               - always 10ms
+uniform:0.005:0.02       - between 5ms and 20ms
+exponential:0.01         - mean 10ms, long tail
+lognormal:0.01:0.5       - median 10ms, sigma 0.5 (realistic API latency)
+
+The server uses a seeded random generator, so the same options give
+the same sequence of delays and errors on every run.
+"""
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Turn a latency spec into a function rng -> seconds."""
+    name, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(':')] if params else []
+    if name in ('none', '0'):
+        return lambda rng: 0.0
+    if name == 'fixed':
+        return lambda rng: values[0]
+    if name == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == 'exponential':
+        return lambda rng: rng.expovariate(1 / values[0])
+    if name == 'lognormal':
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+def make_payload(size_bytes: int) -> bytes:
+    """A JSON array of small objects, about size_bytes long."""
+    items = []
+    size = 2
+    while size < size_bytes:
+        item = {'id': len(items), 'name': f'item-{len(items)}', 'value': len(items) * 1.5}
+        items.append(item)
+        size += len(json.dumps(item)) + 2
+    return json.dumps(items).encode()
+
+
+def build_app(options: Dict[str, Any]) -> web.Application:
+    """Test server app: GET /items/{id} with injected latency and errors."""
+    rng = random.Random(options['seed'])
+    latency = parse_latency(options['latency'])
+    payload = make_payload(options['payload_bytes'])
+    rate_429 = options['rate_429']
+    rate_5xx = options['rate_5xx']
+    retry_after = str(options['retry_after'])
+    
+    async def handle_item(request: web.Request) -> web.Response:
+        delay = latency(rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = rng.random()
+        if roll < rate_429:
+            return web.Response(status=429, headers={'Retry-After': retry_after})
+        if roll < rate_429 + rate_5xx:
+            return web.Response(status=503)
+        return web.Response(body=payload, content_type='application/json')
+    
+    app = web.Application()
+    app.router.add_get('/items/{item_id}', handle_item)
+    return app
+
+
+def serve(options: Dict[str, Any], ready) -> None:
+    """Server process entry point: reports its port through `ready`."""
+    async def main():
+        runner = web.AppRunner(build_app(options), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0, backlog=4096)
+        await site.start()
+        ready.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()  # Run until terminated
+    
+    asyncio.run(main())
+
+
+def start_server(options: Dict[str, Any]) -> tuple:
+    """Start the test server in a child process; returns (process, base_url)."""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    process = context.Process(target=serve, args=(options, ready), daemon=True)
+    process.start()
+    port = ready.get(timeout=30)
+    return process, f'http://127.0.0.1:{port}'
+
+
+# ============================================================================
+# SECTION 2: MEASURING A BENCHMARK
+# ============================================================================
+
+"""
+Every benchmark is a coroutine function call(i) -> bool that makes one
+request and says whether it succeeded. drive() runs `requests` calls
+through bounded_map() at the target concurrency, timing each one into
+a LatencyHistogram.
+"""
+
+def max_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far (None on Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+async def drive(
+    call: Callable[[int], Awaitable[bool]],
+    requests: int,
+    concurrency: int,
+    trace_memory: bool = False
+) -> Dict[str, Any]:
+    """
+    Run call(0) ... call(requests - 1) and summarize the results.
+    
+    Args:
+        call: Makes request i and returns True on success
+        requests: Number of calls
+        concurrency: Maximum calls in flight
+        trace_memory: Record peak Python allocations (slows the run)
+    """
+    histogram = examples.LatencyHistogram()
+    errors = 0
+    
+    async def timed(i: int) -> bool:
+        started = time.perf_counter()
+        try:
+            ok = await call(i)
+        except Exception:
+            ok = False
+        histogram.record(time.perf_counter() - started)
+        return ok
+    
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    async for ok in examples.bounded_map(timed, range(requests), concurrency=concurrency):
+        if not ok:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    
+    result = {
+        'requests': requests,
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'req_per_s': round(requests / elapsed, 1),
+        'mean_ms': round(histogram.total / histogram.count * 1000, 3),
+        'p50_ms': round(histogram.quantile(0.5) * 1000, 3),
+        'p99_ms': round(histogram.quantile(0.99) * 1000, 3),
+        'max_ms': round(histogram.max * 1000, 3),
+        'max_rss_mb': max_rss_mb()
+    }
+    if trace_memory:
+        result['peak_alloc_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 3)
+        tracemalloc.stop()
+    return result
+
+
+# ============================================================================
+# SECTION 3: THE BENCHMARKS
+# ============================================================================
+
+"""
+One benchmark per helper. Each gets the shared session, the server URL
+and the parsed options, and returns the dict from drive() (plus any
+helper-specific counters).
+"""
+
+def item_url(base_url: str, i: int) -> str:
+    return f'{base_url}/items/{i}'
+
+
+async def bench_fetch_url(session, base_url, options) -> Dict[str, Any]:
+    """fetch_url() - what fetch_multiple_urls() runs for each URL."""
+    async def call(i: int) -> bool:
+        result = await examples.fetch_url(session, item_url(base_url, i), adaptive=options.adaptive)
+        return result['status'] == 'success'
+    
+    return await drive(call, options.requests, options.concurrency, options.tracemalloc)
+
+
+async def bench_fetch_with_retry(session, base_url, options) -> Dict[str, Any]:
+    """fetch_with_retry() with its own retry budget and breakers."""
+    policy = examples.RetryPolicy(
+        max_attempts=options.max_attempts,
+        base_delay=options.retry_delay,
+        max_delay=options.retry_delay * 10,
+        budget=examples.RetryBudget(),
+        stats=examples.RetryStats()
+    )
+    breakers = examples.CircuitBreakerRegistry(listeners=[])
+    
+    async def call(i: int) -> bool:
+        data = await examples.fetch_with_retry(
+            session, item_url(base_url, i), policy=policy, breakers=breakers,
+            adaptive=options.adaptive
+        )
+        return data is not None
+    
+    result = await drive(call, options.requests, options.concurrency, options.tracemalloc)
+    result['retry_stats'] = policy.stats.as_dict()
+    return result
+
+
+async def bench_rate_limited_fetch(session, base_url, options) -> Dict[str, Any]:
+    """rate_limited_fetch() at --rate requests per second."""
+    limiter = examples.RateLimiter(options.rate, 1)
+    # Start with the burst used up, so we measure pacing rather than burst
+    limiter.tat = time.monotonic() + limiter.tolerance
+    
+    async def call(i: int) -> bool:
+        await examples.rate_limited_fetch(session, limiter, item_url(base_url, i))
+        return True
+    
+    return await drive(call, options.paced_requests, options.concurrency, options.tracemalloc)
+
+
+async def bench_throttled_fetch(session, base_url, options) -> Dict[str, Any]:
+    """throttled_fetch() with a 1 / --rate second gap between requests."""
+    throttler = examples.Throttler(1 / options.rate)
+    
+    async def call(i: int) -> bool:
+        await examples.throttled_fetch(session, throttler, item_url(base_url, i))
+        return True
+    
+    return await drive(call, options.paced_requests, options.concurrency, options.tracemalloc)
+
+
+async def bench_cache(session, base_url, options) -> Dict[str, Any]:
+    """AsyncCache.get() over Zipf-distributed keys, misses go to fetch_url()."""
+    rng = random.Random(options.seed)
+    weights = [1 / rank for rank in range(1, options.keys + 1)]
+    keys = rng.choices(range(options.keys), weights=weights, k=options.requests)
+    cache = examples.AsyncCache(
+        ttl_seconds=300,
+        max_entries=options.cache_size,
+        policy=options.cache_policy
+    )
+    
+    async def call(i: int) -> bool:
+        url = item_url(base_url, keys[i])
+        result = await cache.get(
+            url, lambda: examples.fetch_url(session, url, adaptive=options.adaptive)
+        )
+        return result['status'] == 'success'
+    
+    result = await drive(call, options.requests, options.concurrency, options.tracemalloc)
+    stats = cache.stats()
+    result['hit_rate'] = round(stats['hits'] / (stats['hits'] + stats['misses']), 4)
+    result['cache_stats'] = {name: stats[name] for name in ('hits', 'misses', 'coalesced', 'evictions')}
+    await cache.close()
+    return result
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    'fetch_url': bench_fetch_url,
+    'fetch_with_retry': bench_fetch_with_retry,
+    'rate_limited_fetch': bench_rate_limited_fetch,
+    'throttled_fetch': bench_throttled_fetch,
+    'cache': bench_cache
+}
+
+
+# ============================================================================
+# SECTION 4: RUNNING, SAVING AND COMPARING
+# ============================================================================
+
+async def run_benchmarks(base_url: str, options) -> Dict[str, Dict[str, Any]]:
+    """Run the selected benchmarks one after another on one session."""
+    manager = examples.SessionManager(
+        limit=options.concurrency,
+        limit_per_host=options.concurrency
+    )
+    if options.trace:
+        manager.trace_configs.append(examples.request_tracer.trace_config())
+    examples.request_tracer.enabled = options.trace
+    
+    results = {}
+    async with manager as session:
+        # Warm up: open connections before anything is measured
+        await asyncio.gather(*[
+            examples.fetch_url(session, item_url(base_url, i), adaptive=False)
+            for i in range(min(options.concurrency, 50))
+        ])
+        for name in options.only or BENCHMARKS:
+            # Fresh breakers and adaptive limits, so one benchmark's
+            # errors can't trip or shrink the next
+            examples.circuit_breakers.breakers.clear()
+            examples.adaptive_limits.limiters.clear()
+            examples.request_tracer.reset()
+            # The helpers print on retries; keep the report readable
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                result = await BENCHMARKS[name](session, base_url, options)
+            if options.trace:
+                result['trace'] = examples.request_tracer.snapshot()
+            if options.adaptive and examples.adaptive_limits.limiters:
+                # The real in-flight cap, which may be far below --concurrency
+                result['adaptive_limits'] = examples.adaptive_limits.snapshot()
+            results[name] = result
+            print_result(name, result)
+    return results
+
+
+def print_result(name: str, result: Dict[str, Any]):
+    print(
+        f"{name:<20} {result['req_per_s']:>10.1f} req/s "
+        f"p50 {result['p50_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+        f"errors {result['errors']:>5}  rss {result['max_rss_mb'] or 0:>7.1f}MB"
+        + ''.join(
+            f"  limit {limiter['limit']:.1f}"
+            for limiter in result.get('adaptive_limits', {}).values()
+        )
+    )
+
+
+def environment() -> Dict[str, Any]:
+    """What the numbers were measured on."""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'aiohttp': aiohttp.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'json_decoder': next(
+            name for name, decoder in examples.JSON_DECODERS.items()
+            if decoder is examples.json_loads
+        )
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print req/s and p99 changes against a saved run."""
+    print(f"\n{'benchmark':<20} {'req/s':>22} {'p99 ms':>24}")
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        throughput = (result['req_per_s'] / old['req_per_s'] - 1) * 100
+        p99 = (result['p99_ms'] / old['p99_ms'] - 1) * 100 if old['p99_ms'] else 0.0
+        print(
+            f"{name:<20} {old['req_per_s']:>8.1f} -> {result['req_per_s']:>8.1f} ({throughput:+5.1f}%) "
+            f"{old['p99_ms']:>7.2f} -> {result['p99_ms']:>7.2f} ({p99:+5.1f}%)"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the Week 9 fetch helpers offline.")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per benchmark")
+    parser.add_argument('--paced-requests', type=int, default=500,
+                        help="Requests for the rate-limited and throttled benchmarks")
+    parser.add_argument('--concurrency', type=int, default=100, help="Requests in flight")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Let the adaptive concurrency limiter cap requests in flight")
+    parser.add_argument('--latency', default='lognormal:0.005:0.5', help="Server latency distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of 5xx answers (and the same again of 429s)")
+    parser.add_argument('--retry-after', type=float, default=0, help="Retry-After sent with 429s")
+    parser.add_argument('--payload-bytes', type=int, default=2048, help="Size of each JSON response")
+    parser.add_argument('--rate', type=int, default=2000, help="Requests per second for the paced benchmarks")
+    parser.add_argument('--max-attempts', type=int, default=3, help="fetch_with_retry attempts")
+    parser.add_argument('--retry-delay', type=float, default=0.005, help="fetch_with_retry base delay")
+    parser.add_argument('--keys', type=int, default=1000, help="Distinct keys for the cache benchmark")
+    parser.add_argument('--cache-size', type=int, default=200, help="AsyncCache max_entries")
+    parser.add_argument('--cache-policy', choices=list(examples.CACHE_POLICIES), default='lru')
+    parser.add_argument('--json-decoder', choices=list(examples.JSON_DECODERS), help="Force a JSON decoder")
+    parser.add_argument('--loop', choices=['auto', 'asyncio', 'uvloop'], default='auto',
+                        help="Event loop (auto = uvloop if installed)")
+    parser.add_argument('--trace', action='store_true', help="Attach the RequestTracer and save its phases")
+    parser.add_argument('--tracemalloc', action='store_true', help="Record peak allocations (slower)")
+    parser.add_argument('--seed', type=int, default=9, help="Random seed for server and keys")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Compare with a previous JSON results file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    options = parse_args(argv)
+    if options.json_decoder:
+        examples.set_json_decoder(options.json_decoder)
+    
+    server_options = {
+        'seed': options.seed,
+        'latency': options.latency,
+        'payload_bytes': options.payload_bytes,
+        'rate_429': options.error_rate,
+        'rate_5xx': options.error_rate,
+        'retry_after': options.retry_after
+    }
+    process, base_url = start_server(server_options)
+    print(f"Test server at {base_url} (latency {options.latency}, error rate {options.error_rate})")
+    try:
+        results, loop_stats = examples.run_with_stats(
+            run_benchmarks(base_url, options),
+            use_uvloop={'auto': None, 'asyncio': False, 'uvloop': True}[options.loop]
+        )
+    finally:
+        process.terminate()
+        process.join()
+    
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'options': vars(options),
+        'server': server_options,
+        'loop': loop_stats.as_dict(),
+        'results': results
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {options.output}")
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), report)
+    return report
+
+
+if __name__ == '__main__':
+    main()
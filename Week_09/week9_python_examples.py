@@ -11,16 +11,56 @@ Learning Objectives:
 - Compare Python and JavaScript async approaches
 """
 
+import argparse
 import asyncio
 import aiohttp
+import heapq
+import inspect
 import json
+import logging
+import math
+import multiprocessing
 import os
+import pickle
+import queue
+import random
+import re
+import signal
+import sqlite3
+import statistics
+import sys
 import time
-from typing import List, Dict, Optional, Any
-from collections import deque
+import traceback
+from typing import (
+    List, Dict, Optional, Any, Union, Callable,
+    Iterable, AsyncIterable, AsyncIterator, Awaitable
+)
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from multiprocessing import shared_memory
+from dataclasses import dataclass, fields, is_dataclass
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from yarl import URL
 from dotenv import load_dotenv
 
+# Optional faster JSON libraries (pip install orjson msgspec)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Optional faster event loop (pip install uvloop; not available on Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Load environment variables
 load_dotenv()
 
@@ -54,6 +94,220 @@ async def run_hello_example():
 # To run: asyncio.run(run_hello_example())
 
 
+"""
+CHOOSING AND TUNING THE EVENT LOOP
+
+asyncio.run() always uses the default asyncio event loop.
+run() below is a drop-in replacement that:
+1. Uses uvloop (an event loop built on libuv) when it is installed,
+   falling back to asyncio otherwise
+2. Sizes the default thread pool used by run_in_executor() / to_thread()
+3. Optionally enables debug mode, which warns about any callback that
+   blocks the loop longer than slow_callback_duration
+4. Prints loop statistics when the run finishes
+
+compare_loops() runs the same workload on both loops (A/B) so the
+difference can be measured instead of assumed.
+"""
+
+class LoopStats:
+    """Numbers collected while run() drives a coroutine."""
+    
+    def __init__(self, loop_name: str):
+        self.loop_name = loop_name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.tasks_created = 0
+        self.slow_callbacks = 0     # Only counted in debug mode
+        self.lag_samples = 0
+        self.lag_total = 0.0
+        self.max_lag = 0.0
+    
+    def record_lag(self, seconds: float):
+        self.lag_samples += 1
+        self.lag_total += seconds
+        if seconds > self.max_lag:
+            self.max_lag = seconds
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'loop': self.loop_name,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'tasks_created': self.tasks_created,
+            'slow_callbacks': self.slow_callbacks,
+            'mean_lag': self.lag_total / self.lag_samples if self.lag_samples else 0.0,
+            'max_lag': self.max_lag
+        }
+    
+    def report(self):
+        stats = self.as_dict()
+        print(
+            f"[{stats['loop']}] wall {stats['wall_seconds']:.3f}s, "
+            f"cpu {stats['cpu_seconds']:.3f}s, tasks {stats['tasks_created']}, "
+            f"loop lag mean {stats['mean_lag'] * 1000:.2f}ms / max {stats['max_lag'] * 1000:.2f}ms, "
+            f"slow callbacks {stats['slow_callbacks']}"
+        )
+
+
+class _SlowCallbackCounter(logging.Filter):
+    """Counts asyncio's 'Executing <callback> took N seconds' warnings."""
+    
+    def __init__(self, stats: LoopStats):
+        super().__init__()
+        self.stats = stats
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if str(record.msg).startswith('Executing'):
+            self.stats.slow_callbacks += 1
+        return True  # Count it, but still log it
+
+
+async def _measure_lag(stats: LoopStats, interval: float):
+    """Wake up every `interval` seconds and record how late we were."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        stats.record_lag(loop.time() - expected)
+
+
+def run_with_stats(
+    main: Awaitable,
+    use_uvloop: Optional[bool] = None,
+    executor_workers: Optional[int] = None,
+    debug: bool = False,
+    slow_callback_duration: float = 0.1,
+    lag_interval: Optional[float] = 0.05
+) -> tuple:
+    """
+    Run a coroutine to completion like asyncio.run().
+    
+    Args:
+        main: Coroutine to run
+        use_uvloop: True/False to force a loop, None = uvloop if installed
+        executor_workers: Threads in the default executor (None = Python's default)
+        debug: Enable asyncio debug mode (slower, reports slow callbacks)
+        slow_callback_duration: Seconds a callback may run before a warning
+        lag_interval: How often to sample loop lag (None = don't sample)
+    
+    Returns:
+        (result of main, LoopStats)
+    """
+    if use_uvloop is None:
+        use_uvloop = uvloop is not None
+    if use_uvloop and uvloop is None:
+        raise RuntimeError("uvloop is not installed (pip install uvloop)")
+    stats = LoopStats('uvloop' if use_uvloop else 'asyncio')
+    
+    async def instrumented():
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = slow_callback_duration
+        if executor_workers:
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=executor_workers))
+        probe = asyncio.create_task(_measure_lag(stats, lag_interval)) if lag_interval else None
+        
+        # Count every task the program creates
+        previous_factory = loop.get_task_factory()
+        
+        def counting_factory(loop, coro, **kwargs):
+            stats.tasks_created += 1
+            if previous_factory is not None:
+                return previous_factory(loop, coro, **kwargs)
+            return asyncio.Task(coro, loop=loop, **kwargs)
+        
+        loop.set_task_factory(counting_factory)
+        try:
+            return await main
+        finally:
+            loop.set_task_factory(previous_factory)
+            if probe is not None:
+                probe.cancel()
+            await http_sessions.close()
+    
+    counter = _SlowCallbackCounter(stats)
+    if debug:
+        logging.getLogger('asyncio').addFilter(counter)
+    loop_factory = uvloop.new_event_loop if use_uvloop else None
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        with asyncio.Runner(debug=debug, loop_factory=loop_factory) as runner:
+            result = runner.run(instrumented())
+    finally:
+        stats.wall_seconds = time.perf_counter() - wall_started
+        stats.cpu_seconds = time.process_time() - cpu_started
+        logging.getLogger('asyncio').removeFilter(counter)
+    return result, stats
+
+
+def run(main: Awaitable, report: bool = True, **options) -> Any:
+    """
+    Drop-in replacement for asyncio.run() (see run_with_stats for options).
+    
+    Prints a one-line loop summary at the end unless report=False.
+    """
+    result, stats = run_with_stats(main, **options)
+    if report:
+        stats.report()
+    return result
+
+
+def compare_loops(
+    make_main: Callable[[], Awaitable],
+    rounds: int = 5,
+    **options
+) -> Dict[str, Dict[str, float]]:
+    """
+    A/B benchmark: run the same workload on asyncio and on uvloop.
+    
+    Rounds alternate between the loops, so warm-up and background noise
+    affect both equally. The median of each loop's rounds is reported.
+    
+    Args:
+        make_main: Function returning a fresh coroutine for each round
+        rounds: Runs per loop
+        **options: Passed to run_with_stats()
+    """
+    print("\n--- EVENT LOOP A/B BENCHMARK ---")
+    choices = [False, True] if uvloop is not None else [False]
+    if uvloop is None:
+        print("uvloop is not installed - measuring asyncio only")
+    
+    runs: Dict[bool, List[LoopStats]] = {choice: [] for choice in choices}
+    for _ in range(rounds):
+        for choice in choices:
+            _, stats = run_with_stats(make_main(), use_uvloop=choice, **options)
+            runs[choice].append(stats)
+    
+    results = {}
+    for choice, samples in runs.items():
+        results[samples[0].loop_name] = {
+            'wall_seconds': statistics.median(s.wall_seconds for s in samples),
+            'cpu_seconds': statistics.median(s.cpu_seconds for s in samples),
+            'max_lag': max(s.max_lag for s in samples)
+        }
+    for name, result in results.items():
+        print(f"{name:<8} wall {result['wall_seconds']:.3f}s  cpu {result['cpu_seconds']:.3f}s  max lag {result['max_lag'] * 1000:.2f}ms")
+    if len(results) == 2:
+        speedup = results['asyncio']['wall_seconds'] / results['uvloop']['wall_seconds']
+        print(f"uvloop speedup: {speedup:.2f}x")
+    return results
+
+
+async def loop_workload(tasks: int = 20_000, hops: int = 10):
+    """Pure event-loop work (no I/O): many tasks handing off to each other."""
+    finished: asyncio.Queue = asyncio.Queue()
+    
+    async def worker():
+        for _ in range(hops):
+            await asyncio.sleep(0)
+        finished.put_nowait(1)
+    
+    await asyncio.gather(*[worker() for _ in range(tasks)])
+    return finished.qsize()
+
+
 # ============================================================================
 # SECTION 2: THE EVENT LOOP AND ASYNC CONTEXT
 # ============================================================================
@@ -165,6 +419,109 @@ async def gather_example():
 # asyncio.run(gather_example())
 
 
+"""
+gather() starts EVERYTHING at once. That is fine for 4 items, but with
+200,000 URLs it creates 200,000 tasks, opens sockets without limit and
+holds every result in memory until the last one finishes.
+
+bounded_map() pulls inputs lazily, keeps at most `concurrency` calls in
+flight and yields results as they finish, so memory stays constant no
+matter how long the input is.
+"""
+
+async def bounded_map(
+    fn: Callable[[Any], Awaitable[Any]],
+    iterable: Union[Iterable, AsyncIterable],
+    concurrency: int = 10,
+    ordered: bool = False,
+    return_exceptions: bool = False
+) -> AsyncIterator[Any]:
+    """
+    Apply an async function to every item with bounded concurrency.
+    
+    Args:
+        fn: Async function called once per item
+        iterable: Items (a regular or async iterable, consumed lazily)
+        concurrency: Maximum calls in flight at once
+        ordered: Yield results in input order (otherwise as completed)
+        return_exceptions: Yield exceptions instead of raising them
+    
+    Yields:
+        Results of fn(item)
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    
+    is_async = hasattr(iterable, '__aiter__')
+    iterator = iterable.__aiter__() if is_async else iter(iterable)
+    
+    # Finished tasks are pushed here, so waiting for the next one is O(1)
+    completed: asyncio.Queue = asyncio.Queue()
+    pending: Dict[asyncio.Task, int] = {}
+    finished: Dict[int, asyncio.Task] = {}  # Out-of-order results (ordered mode)
+    next_index = 0
+    next_to_yield = 0
+    exhausted = False
+    
+    def outcome(task: asyncio.Task) -> Any:
+        if return_exceptions and task.exception() is not None:
+            return task.exception()
+        return task.result()
+    
+    try:
+        while True:
+            # Top up to the concurrency limit (buffered results count too)
+            while not exhausted and len(pending) + len(finished) < concurrency:
+                try:
+                    item = await iterator.__anext__() if is_async else next(iterator)
+                except (StopIteration, StopAsyncIteration):
+                    exhausted = True
+                    break
+                task = asyncio.ensure_future(fn(item))
+                task.add_done_callback(completed.put_nowait)
+                pending[task] = next_index
+                next_index += 1
+            
+            if not pending:
+                break
+            
+            task = await completed.get()
+            index = pending.pop(task)
+            if not ordered:
+                yield outcome(task)
+                continue
+            
+            finished[index] = task
+            while next_to_yield in finished:
+                yield outcome(finished.pop(next_to_yield))
+                next_to_yield += 1
+    finally:
+        # Consumer stopped early or an error escaped: cancel the rest
+        for task in pending:
+            task.cancel()
+
+
+async def bounded_map_example():
+    """Fetch 1,000 items with at most 50 in flight."""
+    print("\n--- BOUNDED MAP EXAMPLE ---")
+    start = time.time()
+    
+    count = 0
+    async for item in bounded_map(
+        lambda i: fetch_data(i, delay=0.1),
+        range(1000),
+        concurrency=50
+    ):
+        count += 1
+    
+    elapsed = time.time() - start
+    print(f"Fetched {count} items in {elapsed:.1f}s (50 at a time)")
+    return count
+
+
+# asyncio.run(bounded_map_example())
+
+
 # ============================================================================
 # SECTION 4: ERROR HANDLING IN ASYNC CODE
 # ============================================================================
@@ -216,23 +573,582 @@ async def error_handling_example():
 aiohttp is the async library for making HTTP requests
 Much more efficient than requests library for multiple requests
 Uses the same connection pool and event loop
+
+Creating a ClientSession per request throws that pool away: every call
+pays for a new DNS lookup, TCP connect and TLS handshake. Share one
+session per process (per event loop) instead - see SessionManager.
+Close it at shutdown: run() does, or wrap the work in
+"async with http_sessions as session:".
+"""
+
+class SessionManager:
+    """
+    Process-wide owner of one tuned aiohttp ClientSession per event loop.
+    
+    The connector caps total and per-host connections, caches DNS
+    lookups and keeps idle connections alive for reuse.
+    """
+    
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        ttl_dns_cache: int = 300,
+        keepalive_timeout: float = 30,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize session manager.
+        
+        Args:
+            limit: Maximum open connections in total
+            limit_per_host: Maximum open connections per host
+            ttl_dns_cache: Seconds to cache DNS results
+            keepalive_timeout: Seconds to keep idle connections open
+            timeout: Default timeout (per request timeouts override it)
+            headers: Default headers sent with every request
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout or aiohttp.ClientTimeout(total=30, connect=10)
+        self.headers = headers
+        self.trace_configs: List[aiohttp.TraceConfig] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._users = 0
+        self._closing: set = set()
+    
+    def session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # A session is bound to the loop it was created on
+            if self._session is not None and not self._session.closed:
+                self._discard(self._session, self._loop)
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.ttl_dns_cache,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=self.headers,
+                trace_configs=self.trace_configs or None
+            )
+            self._loop = loop
+        return self._session
+    
+    def _discard(self, session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop):
+        """Close a session left behind by another event loop."""
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        # Its loop has finished, so its connections are gone already;
+        # close() just marks it closed (no "Unclosed client session")
+        task = asyncio.ensure_future(session.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+    
+    async def close(self):
+        """Close the shared session (run() does this at shutdown)."""
+        session, self._session, self._loop = self._session, None, None
+        if session is not None and not session.closed:
+            await session.close()
+    
+    async def __aenter__(self) -> aiohttp.ClientSession:
+        # Nested "async with http_sessions" blocks share one session;
+        # the outermost one closes it
+        self._users += 1
+        return self.session()
+    
+    async def __aexit__(self, *exc_info):
+        self._users -= 1
+        if self._users == 0:
+            await self.close()
+
+
+http_sessions = SessionManager()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared ClientSession for the running event loop."""
+    return http_sessions.session()
+
+
+"""
+REQUEST TRACING
+
+print() tells us that a request was slow, not why. aiohttp can call us
+back at each step of a request (TraceConfig): DNS lookup, waiting for a
+pooled connection, connecting, response headers. RequestTracer times
+those steps per host and keeps the results in histograms, so we can
+ask "what is the p99 connect time to api.github.com?" at any moment.
+"""
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of durations (microsecond resolution).
+    
+    Values are grouped by power of two and each group is split into
+    2 ** (precision_bits - 1) equal steps, so every bucket is within a
+    few percent of the true value from 1µs up to an hour, using only a
+    few hundred counters. record() does no allocation and no sorting.
+    """
+    
+    __slots__ = ('precision_bits', 'half', 'linear_limit', 'highest', 'counts', 'count', 'total', 'max')
+    
+    def __init__(self, precision_bits: int = 5, highest_seconds: float = 3600.0):
+        """
+        Initialize histogram.
+        
+        Args:
+            precision_bits: 5 keeps values within about 3%
+            highest_seconds: Larger values are recorded as this
+        """
+        self.precision_bits = precision_bits
+        self.half = 1 << (precision_bits - 1)
+        self.linear_limit = 1 << precision_bits
+        self.highest = int(highest_seconds * 1_000_000)
+        self.counts = [0] * (self._index(self.highest) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def _index(self, micros: int) -> int:
+        if micros < self.linear_limit:
+            return micros
+        shift = micros.bit_length() - self.precision_bits
+        return shift * self.half + (micros >> shift)
+    
+    def _value(self, index: int) -> float:
+        """Midpoint of a bucket, in seconds."""
+        if index < self.linear_limit:
+            return index / 1_000_000
+        shift = index // self.half - 1
+        low = (index - shift * self.half) << shift
+        return (low + (1 << shift) / 2) / 1_000_000
+    
+    def record(self, seconds: float):
+        micros = int(seconds * 1_000_000)
+        if micros >= self.linear_limit:
+            if micros > self.highest:
+                micros = self.highest
+            shift = micros.bit_length() - self.precision_bits
+            micros = shift * self.half + (micros >> shift)
+        elif micros < 0:
+            micros = 0
+        self.counts[micros] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def quantile(self, q: float) -> float:
+        """Approximate value below which a fraction q of samples fall."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+    
+    def merge(self, other: 'LatencyHistogram'):
+        """Add another histogram's samples (same precision_bits)."""
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("Histograms must use the same precision_bits")
+        for index, count in enumerate(other.counts[:len(self.counts)]):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+    
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'p999': self.quantile(0.999),
+            'max': self.max
+        }
+    
+    def export(self) -> Dict[str, Any]:
+        """JSON-friendly form: only non-empty [bucket_seconds, count] pairs."""
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'buckets': [
+                [self._value(index), count]
+                for index, count in enumerate(self.counts) if count
+            ]
+        }
+
+
+class RequestTracer:
+    """
+    Per-host latency histograms for each phase of a request.
+    
+    From aiohttp TraceConfig signals:
+        queued     - waiting for a free connection in the pool
+        dns        - resolving the host name (DNS cache misses only)
+        connect    - opening a new connection, TCP and TLS together
+                     (aiohttp has no separate TLS handshake signal)
+        ttfb       - request start until the response headers arrive
+    From the fetch helpers:
+        total      - request start until the body has been read
+        rate_limit - waiting in a rate limiter
+        throttle   - waiting in a throttler
+        backoff    - sleeping between retries
+    """
+    
+    def __init__(self, max_hosts: int = 1000, precision_bits: int = 5):
+        """
+        Initialize tracer.
+        
+        Args:
+            max_hosts: Hosts tracked separately; the rest share '(other)'
+            precision_bits: Passed to each LatencyHistogram
+        """
+        self.max_hosts = max_hosts
+        self.precision_bits = precision_bits
+        self.hosts: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self.enabled = True
+    
+    def record(self, host: str, phase: str, seconds: float):
+        if not self.enabled:
+            return
+        phases = self.hosts.get(host)
+        if phases is None:
+            if len(self.hosts) >= self.max_hosts:
+                host = '(other)'
+            phases = self.hosts.setdefault(host, {})
+        histogram = phases.get(phase)
+        if histogram is None:
+            histogram = phases[phase] = LatencyHistogram(self.precision_bits)
+        histogram.record(seconds)
+    
+    def record_since(self, host: str, phase: str, started: float) -> float:
+        """Record time since a perf_counter() reading; returns the new reading."""
+        now = time.perf_counter()
+        self.record(host, phase, now - started)
+        return now
+    
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """TraceConfig to pass to ClientSession(trace_configs=[...])."""
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(self._on_request_start)
+        config.on_request_end.append(self._on_request_end)
+        config.on_connection_queued_start.append(self._on_start)
+        config.on_connection_queued_end.append(self._on_queued_end)
+        config.on_connection_create_start.append(self._on_start)
+        config.on_connection_create_end.append(self._on_connect_end)
+        config.on_dns_resolvehost_start.append(self._on_start)
+        config.on_dns_resolvehost_end.append(self._on_dns_end)
+        return config
+    
+    # Trace callbacks: `context` is a fresh namespace for every request
+    async def _on_request_start(self, session, context, params):
+        context.host = params.url.host_port_subcomponent
+        context.started = time.perf_counter()
+    
+    async def _on_request_end(self, session, context, params):
+        self.record(context.host, 'ttfb', time.perf_counter() - context.started)
+    
+    async def _on_start(self, session, context, params):
+        context.step_started = time.perf_counter()
+    
+    async def _on_queued_end(self, session, context, params):
+        self.record(context.host, 'queued', time.perf_counter() - context.step_started)
+    
+    async def _on_connect_end(self, session, context, params):
+        self.record(context.host, 'connect', time.perf_counter() - context.step_started)
+    
+    async def _on_dns_end(self, session, context, params):
+        self.record(context.host, 'dns', time.perf_counter() - context.step_started)
+    
+    def snapshot(self, host: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Percentiles per host and phase (or for one host)."""
+        hosts = self.hosts if host is None else {host: self.hosts.get(host, {})}
+        return {
+            name: {phase: histogram.snapshot() for phase, histogram in phases.items()}
+            for name, phases in hosts.items()
+        }
+    
+    def export(self) -> Dict[str, Any]:
+        """Full histograms as JSON-friendly data (for files or dashboards)."""
+        return {
+            'precision_bits': self.precision_bits,
+            'hosts': {
+                name: {phase: histogram.export() for phase, histogram in phases.items()}
+                for name, phases in self.hosts.items()
+            }
+        }
+    
+    def report(self):
+        """Print a p50/p99 table per host and phase."""
+        print(f"{'host':<30} {'phase':<11} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, phases in self.snapshot().items():
+            for phase, stats in phases.items():
+                print(
+                    f"{name:<30} {phase:<11} {stats['count']:>7} "
+                    f"{stats['p50'] * 1000:>9.2f} {stats['p99'] * 1000:>9.2f} {stats['max'] * 1000:>9.2f}"
+                )
+    
+    def reset(self):
+        self.hosts.clear()
+
+
+request_tracer = RequestTracer()
+http_sessions.trace_configs.append(request_tracer.trace_config())
+
+
 """
+JSON DECODING
+
+response.json() decodes the body to text and then parses it with the
+stdlib json module. In high-volume loops decoding is often the main CPU
+cost, so every helper decodes the raw bytes through one pluggable hook.
+msgspec or orjson are used automatically when installed.
+"""
+
+JSON_DECODERS: Dict[str, Callable[[bytes], Any]] = {'json': json.loads}
+if orjson is not None:
+    JSON_DECODERS['orjson'] = orjson.loads
+if msgspec is not None:
+    JSON_DECODERS['msgspec'] = msgspec.json.decode
+
 
-async def fetch_url(session: aiohttp.ClientSession, url: str) -> Dict:
-    """Fetch a single URL."""
+def select_json_decoder(name: Optional[str] = None) -> Callable[[bytes], Any]:
+    """Return the named decoder, or the fastest one installed."""
+    if name is not None:
+        return JSON_DECODERS[name]
+    for preferred in ('msgspec', 'orjson', 'json'):
+        if preferred in JSON_DECODERS:
+            return JSON_DECODERS[preferred]
+
+
+json_loads = select_json_decoder()
+
+
+def set_json_decoder(decoder: Union[str, Callable[[bytes], Any]]):
+    """Switch the decoder used by every helper ('json', 'orjson', 'msgspec' or a function)."""
+    global json_loads
+    json_loads = JSON_DECODERS[decoder] if isinstance(decoder, str) else decoder
+
+
+def msgspec_active() -> bool:
+    """True when msgspec is the selected decoder (enables typed decoding)."""
+    return msgspec is not None and json_loads is JSON_DECODERS['msgspec']
+
+
+class InvalidJSONError(aiohttp.ClientPayloadError, ValueError):
+    """
+    Response body is not valid JSON.
+    
+    A ClientError, like the ContentTypeError response.json() raises, so
+    helpers that handle network errors handle this too.
+    """
+
+
+async def read_json(
+    response: aiohttp.ClientResponse,
+    loads: Optional[Callable[[bytes], Any]] = None
+) -> Any:
+    """Decode a response body straight from bytes (invalid JSON raises InvalidJSONError)."""
+    body = await response.read()
     try:
-        async with session.get(url) as response:
-            # Wait for response
-            if response.status == 200:
-                data = await response.json()
-                return {'status': 'success', 'data': data}
+        return (loads or json_loads)(body)
+    except ValueError as e:
+        # json, orjson and msgspec all raise ValueError subclasses
+        content_type = response.headers.get('Content-Type', 'no content type')
+        raise InvalidJSONError(f"Invalid JSON from {response.url} ({content_type}): {e}") from e
+
+
+"""
+STREAMING JSON ARRAYS
+
+read_json() holds the whole body and then the whole parsed list in
+memory. For large list endpoints we can instead cut the array into
+elements as the bytes arrive and decode one element at a time.
+"""
+
+_JSON_STRUCTURE = re.compile(rb'[\[\]{},"]')
+_JSON_WHITESPACE = re.compile(rb'\s*')
+
+
+class JSONArrayParser:
+    """
+    Incremental parser that splits a top-level JSON array into elements.
+    
+    feed() takes raw chunks and returns the elements completed so far.
+    Only the bytes of the unfinished element are kept, so memory is
+    bounded by the largest element rather than the whole body.
+    """
+    
+    def __init__(self, loads: Optional[Callable[[bytes], Any]] = None):
+        self.loads = loads
+        self.buffer = bytearray()
+        self.position = 0       # Next byte to scan
+        self.start = None       # Start of the current element (None before '[')
+        self.depth = 0          # Nesting inside the current element
+        self.in_string = False
+        self.count = 0
+        self.done = False
+    
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Add a chunk and return the elements it completed."""
+        if self.done:
+            if chunk.strip():
+                raise ValueError('Data after the end of the JSON array')
+            return []
+        
+        buffer = self.buffer
+        buffer += chunk
+        loads = self.loads or json_loads
+        items = []
+        position = self.position
+        while True:
+            if self.start is None:
+                position = _JSON_WHITESPACE.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                if buffer[position] != 0x5B:  # '['
+                    raise ValueError('Expected a JSON array')
+                position += 1
+                self.start = position
+                continue
+            
+            if self.in_string:
+                end = buffer.find(b'"', position)
+                if end < 0:
+                    position = len(buffer)
+                    break
+                # A quote after an odd number of backslashes is escaped
+                backslashes = 0
+                while buffer[end - 1 - backslashes] == 0x5C:
+                    backslashes += 1
+                position = end + 1
+                self.in_string = backslashes % 2 == 1
+                continue
+            
+            match = _JSON_STRUCTURE.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            char = buffer[match.start()]
+            position = match.end()
+            if char == 0x22:  # '"'
+                self.in_string = True
+            elif char in b'[{':
+                self.depth += 1
+            elif self.depth:
+                if char != 0x2C:  # Commas inside an element don't matter
+                    self.depth -= 1
+            elif char == 0x7D:
+                raise ValueError('Unbalanced } in JSON array')
             else:
-                return {
-                    'status': 'error',
-                    'code': response.status,
-                    'reason': response.reason
-                }
-    except aiohttp.ClientError as e:
+                # ',' or ']' at the top level ends an element
+                element = buffer[self.start:match.start()]
+                if element.strip():
+                    items.append(loads(element))
+                    self.count += 1
+                elif char == 0x2C or self.count:
+                    raise ValueError('Empty element in JSON array')
+                self.start = position
+                if char == 0x5D:  # ']'
+                    self.done = True
+                    if buffer[position:].strip():
+                        raise ValueError('Data after the end of the JSON array')
+                    break
+        
+        # Drop everything before the unfinished element
+        keep_from = position if self.start is None or self.done else self.start
+        del buffer[:keep_from]
+        self.position = position - keep_from
+        if self.start is not None:
+            self.start -= keep_from
+        return items
+    
+    def close(self):
+        """Call at end of input; raises if the array was cut short."""
+        if not self.done:
+            raise ValueError('Truncated JSON array')
+
+
+async def iter_json_array(
+    response: aiohttp.ClientResponse,
+    loads: Optional[Callable[[bytes], Any]] = None,
+    chunk_size: int = 64 * 1024
+) -> AsyncIterator[Any]:
+    """
+    Yield the elements of a JSON array body as they arrive.
+    
+    Args:
+        response: Response whose body is a JSON array
+        loads: Decoder for one element (default: the json_loads hook)
+        chunk_size: Bytes read from the connection at a time
+    """
+    parser = JSONArrayParser(loads)
+    async for chunk in response.content.iter_chunked(chunk_size):
+        for item in parser.feed(chunk):
+            yield item
+    parser.close()
+
+
+async def fetch_url(
+    session: aiohttp.ClientSession,
+    url: str,
+    limits: Optional['AdaptiveLimiterRegistry'] = None,
+    adaptive: bool = False
+) -> Dict:
+    """
+    Fetch a single URL.
+    
+    Fails fast if the host's circuit is open. With adaptive=True it also
+    waits for a slot under the host's adaptive concurrency limit.
+    
+    Args:
+        session: aiohttp session
+        url: URL to fetch
+        limits: Adaptive concurrency limits per host (default: module-wide)
+        adaptive: Opt in to the adaptive limit (default: only the
+            session's connection limits apply)
+    """
+    breaker = circuit_breakers.for_url(url)
+    try:
+        breaker.allow_request()
+        async with (limits or adaptive_limits).slot(url, adaptive) as slot:
+            started = time.perf_counter()
+            async with session.get(url) as response:
+                slot.status = response.status
+                # Wait for response
+                if response.status == 200:
+                    data = await read_json(response)
+                    # Recorded once the body decoded, so a bad body is one failure
+                    breaker.record_status(response.status)
+                    request_tracer.record_since(breaker.name, 'total', started)
+                    return {'status': 'success', 'data': data}
+                else:
+                    breaker.record_status(response.status)
+                    return {
+                        'status': 'error',
+                        'code': response.status,
+                        'reason': response.reason
+                    }
+    except CircuitOpenError as e:
+        return {'status': 'error', 'error': str(e)}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        breaker.record_failure()
         return {'status': 'error', 'error': str(e)}
 
 
@@ -248,13 +1164,17 @@ async def fetch_multiple_urls():
         'https://jsonplaceholder.typicode.com/users/2'
     ]
     
-    # Create a session (manages connections)
-    async with aiohttp.ClientSession() as session:
-        # Create tasks for all URLs
-        tasks = [fetch_url(session, url) for url in urls]
-        
-        # Fetch all in parallel
-        results = await asyncio.gather(*tasks)
+    # Reuse the shared session (and its connection pool)
+    async with http_sessions as session:
+        # Fetch in parallel, but never more than 10 requests at once
+        results = [
+            result async for result in bounded_map(
+                lambda url: fetch_url(session, url),
+                urls,
+                concurrency=10,
+                ordered=True
+            )
+        ]
     
     successful = sum(1 for r in results if r['status'] == 'success')
     print(f"Successfully fetched {successful}/{len(urls)} URLs")
@@ -262,6 +1182,19 @@ async def fetch_multiple_urls():
     return results
 
 
+async def tracing_example():
+    """Show where the time went for a batch of requests."""
+    print("\n--- REQUEST TRACING EXAMPLE ---")
+    
+    request_tracer.reset()
+    async with http_sessions:
+        await fetch_multiple_urls()
+        await fetch_multiple_urls()  # Second round reuses pooled connections
+    
+    request_tracer.report()
+    return request_tracer.snapshot()
+
+
 # asyncio.run(fetch_multiple_urls())
 
 
@@ -276,41 +1209,133 @@ Complete example using a real API with proper error handling
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY', 'YOUR_API_KEY_HERE')
 
 
-async def get_weather(session: aiohttp.ClientSession, city: str) -> Dict:
-    """Fetch weather for a city."""
+@dataclass(slots=True)
+class WeatherReport:
+    """Typed, slotted weather result (smaller and faster than a dict)."""
+    city: str
+    country: str
+    temperature: float
+    feels_like: float
+    condition: str
+    humidity: int
+    wind_speed: float
+    
+    @classmethod
+    def from_payload(cls, data: Dict) -> 'WeatherReport':
+        """Build from an already-decoded OpenWeather response."""
+        return cls(
+            city=data['name'],
+            country=data['sys']['country'],
+            temperature=float(data['main']['temp']),
+            feels_like=float(data['main']['feels_like']),
+            condition=data['weather'][0]['main'],
+            humidity=int(data['main']['humidity']),
+            wind_speed=float(data['wind']['speed'])
+        )
+
+
+# The nested shape of an OpenWeather response, for msgspec's typed decoder.
+# No defaults: a missing field fails here just as from_payload's KeyError does.
+@dataclass(slots=True)
+class _OWMain:
+    temp: float
+    feels_like: float
+    humidity: int
+
+
+@dataclass(slots=True)
+class _OWCondition:
+    main: str
+
+
+@dataclass(slots=True)
+class _OWSys:
+    country: str
+
+
+@dataclass(slots=True)
+class _OWWind:
+    speed: float
+
+
+@dataclass(slots=True)
+class _OWPayload:
+    name: str
+    main: _OWMain
+    weather: List[_OWCondition]
+    sys: _OWSys
+    wind: _OWWind
+
+
+_weather_decoder = msgspec.json.Decoder(_OWPayload) if msgspec is not None else None
+
+
+def decode_weather(body: bytes) -> WeatherReport:
+    """Decode response bytes into a WeatherReport."""
+    if not msgspec_active():
+        return WeatherReport.from_payload(json_loads(body))
+    # msgspec validates and builds typed objects with no intermediate dicts
+    payload = _weather_decoder.decode(body)
+    return WeatherReport(
+        city=payload.name,
+        country=payload.sys.country,
+        temperature=payload.main.temp,
+        feels_like=payload.main.feels_like,
+        condition=payload.weather[0].main,
+        humidity=payload.main.humidity,
+        wind_speed=payload.wind.speed
+    )
+
+
+async def get_weather(
+    session: aiohttp.ClientSession,
+    city: str,
+    http_cache: Optional['HTTPCache'] = None,
+    typed: bool = False
+) -> Union[Dict, WeatherReport]:
+    """
+    Fetch weather for a city (pass an HTTPCache to reuse responses).
+    
+    With typed=True the body is decoded straight into a WeatherReport
+    instead of a dict; errors are still returned as {'error': ...}.
+    """
     url = (
         f'https://api.openweathermap.org/data/2.5/weather'
         f'?q={city}&appid={WEATHER_API_KEY}&units=metric'
     )
     
     try:
-        async with session.get(url) as response:
-            # Check status
-            if response.status == 404:
-                return {'error': f'City "{city}" not found'}
-            elif response.status == 401:
-                return {'error': 'Invalid API key'}
-            elif response.status == 429:
-                return {'error': 'Rate limited - too many requests'}
-            elif response.status != 200:
-                return {'error': f'HTTP {response.status}: {response.reason}'}
-            
-            # Parse JSON
-            data = await response.json()
-            
-            return {
-                'city': data['name'],
-                'country': data['sys']['country'],
-                'temperature': data['main']['temp'],
-                'feels_like': data['main']['feels_like'],
-                'condition': data['weather'][0]['main'],
-                'humidity': data['main']['humidity'],
-                'wind_speed': data['wind']['speed']
-            }
-            
+        decode = decode_weather if typed else None
+        response = await conditional_get(session, url, http_cache, decode=decode)
+        
+        # Check status
+        if response.status == 404:
+            return {'error': f'City "{city}" not found'}
+        elif response.status == 401:
+            return {'error': 'Invalid API key'}
+        elif response.status == 429:
+            return {'error': 'Rate limited - too many requests'}
+        elif response.status != 200:
+            return {'error': f'HTTP {response.status}: {response.reason}'}
+        
+        if typed:
+            return response.data
+        data = response.data
+        
+        return {
+            'city': data['name'],
+            'country': data['sys']['country'],
+            'temperature': data['main']['temp'],
+            'feels_like': data['main']['feels_like'],
+            'condition': data['weather'][0]['main'],
+            'humidity': data['main']['humidity'],
+            'wind_speed': data['wind']['speed']
+        }
+    
     except aiohttp.ClientError as e:
         return {'error': f'Network error: {str(e)}'}
-    except json.JSONDecodeError:
+    except (ValueError, KeyError, IndexError):
+        # Invalid JSON (any decoder) or an unexpected payload shape
         return {'error': 'Invalid JSON response'}
 
 
@@ -318,12 +1343,16 @@ async def get_weather_for_cities(cities: List[str]) -> List[Dict]:
     """Fetch weather for multiple cities in parallel."""
     print("\n--- WEATHER FOR MULTIPLE CITIES ---")
     
-    async with aiohttp.ClientSession() as session:
-        # Create tasks for all cities
-        tasks = [get_weather(session, city) for city in cities]
-        
-        # Fetch all in parallel
-        results = await asyncio.gather(*tasks)
+    async with http_sessions as session:
+        # Fetch in parallel with bounded concurrency, keeping input order
+        results = [
+            weather async for weather in bounded_map(
+                lambda city: get_weather(session, city),
+                cities,
+                concurrency=10,
+                ordered=True
+            )
+        ]
     
     for city, weather in zip(cities, results):
         if 'error' in weather:
@@ -357,21 +1386,30 @@ async def call_api_with_key_in_url(
     """Make request with API key in URL."""
     full_url = f"{url}?api_key={api_key}"
     async with session.get(full_url) as response:
-        return await response.json()
+        return await read_json(response)
 
 
 async def call_api_with_key_in_header(
     session: aiohttp.ClientSession,
     url: str,
-    api_key: str
+    api_key: str,
+    limiter: Optional['KeyedRateLimiter'] = None
 ) -> Dict:
-    """Make request with API key in header."""
+    """
+    Make request with API key in header.
+    
+    Pass a KeyedRateLimiter to enforce each tenant's quota by API key.
+    """
+    if limiter is not None:
+        started = time.perf_counter()
+        await limiter.wait_if_needed(api_key)
+        request_tracer.record_since(host_key(url), 'rate_limit', started)
     headers = {
         'X-API-Key': api_key,
         'Content-Type': 'application/json'
     }
     async with session.get(url, headers=headers) as response:
-        return await response.json()
+        return await read_json(response)
 
 
 async def call_api_with_bearer_token(
@@ -385,7 +1423,7 @@ async def call_api_with_bearer_token(
         'Content-Type': 'application/json'
     }
     async with session.get(url, headers=headers) as response:
-        return await response.json()
+        return await read_json(response)
 
 
 async def call_api_with_basic_auth(
@@ -396,7 +1434,7 @@ async def call_api_with_basic_auth(
 ) -> Dict:
     """Make request with Basic authentication."""
     async with session.get(url, auth=aiohttp.BasicAuth(username, password)) as response:
-        return await response.json()
+        return await read_json(response)
 
 
 # ============================================================================
@@ -409,86 +1447,389 @@ Throttling slows down requests to stay within limits
 """
 
 class RateLimiter:
-    """Simple rate limiter using asyncio."""
+    """
+    Token-bucket rate limiter using GCRA (Generic Cell Rate Algorithm).
+    
+    Instead of storing a timestamp per request, GCRA keeps a single
+    "theoretical arrival time" (TAT). Each caller reserves the next slot
+    in O(1) and then sleeps *outside* any lock, so thousands of waiters
+    never queue behind one sleeping coroutine.
     
-    def __init__(self, max_requests: int, period_seconds: int = 60):
+    Any window of period_seconds sees at most max_requests + burst - 1
+    requests (give or take timer precision at the window's edges). With
+    the default burst=1 requests are evenly spaced and
+    max_requests per period is a hard limit; a larger burst lets an idle
+    client catch up faster, at the cost of that overshoot.
+    """
+    
+    __slots__ = ('max_requests', 'period', 'burst', 'interval', 'tolerance', 'tat')
+    
+    def __init__(self, max_requests: int, period_seconds: int = 60, burst: int = 1):
         """
         Initialize rate limiter.
         
         Args:
-            max_requests: Maximum requests allowed
+            max_requests: Maximum requests allowed per period
             period_seconds: Time period for the limit
+            burst: Requests that may be sent back to back after idling
+                (up to max_requests; above 1 the per-period limit can be
+                exceeded by burst - 1)
         """
+        if max_requests <= 0:
+            raise ValueError("max_requests must be positive")
+        if not 1 <= burst <= max_requests:
+            raise ValueError("burst must be between 1 and max_requests")
         self.max_requests = max_requests
         self.period = period_seconds
-        self.requests = deque()  # Timestamps of requests
-        self.lock = asyncio.Lock()
+        self.burst = burst
+        # Spacing between requests once the burst is used up
+        self.interval = period_seconds / max_requests
+        # How far ahead of schedule a burst may run
+        self.tolerance = (burst - 1) * self.interval
+        self.tat = 0.0  # Theoretical arrival time (monotonic clock)
+    
+    def reserve(self) -> float:
+        """
+        Reserve the next slot and return how long to wait for it.
+        
+        This is synchronous, so no other coroutine can run between
+        reading and updating the TAT - no lock is needed.
+        """
+        now = time.monotonic()
+        tat = self.tat if self.tat > now else now
+        self.tat = tat + self.interval
+        return tat - self.tolerance - now
     
     async def wait_if_needed(self):
         """Wait if we've reached the rate limit."""
-        async with self.lock:
-            now = time.time()
-            cutoff = now - self.period
-            
-            # Remove old requests outside the period
-            while self.requests and self.requests[0] < cutoff:
-                self.requests.popleft()
-            
-            # If at limit, wait
-            if len(self.requests) >= self.max_requests:
-                sleep_time = self.requests[0] + self.period - now
-                if sleep_time > 0:
-                    print(f"Rate limit reached. Waiting {sleep_time:.1f}s...")
-                    await asyncio.sleep(sleep_time)
-                    return await self.wait_if_needed()
-            
-            # Record this request
-            self.requests.append(now)
-
-
-async def rate_limited_fetch(
-    session: aiohttp.ClientSession,
-    limiter: RateLimiter,
-    url: str
-) -> str:
-    """Fetch URL with rate limiting."""
-    await limiter.wait_if_needed()
-    async with session.get(url) as response:
-        return await response.text()
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
 
 
-class Throttler:
-    """Throttle requests with a minimum delay between them."""
+class KeyedRateLimiter:
+    """
+    Registry of per-key rate limiters (per API key, host or route).
     
-    def __init__(self, delay_seconds: float = 1.0):
+    Buckets are created lazily on first use and kept in LRU order, so
+    lookups are O(1). A bucket whose TAT is in the past is full again and
+    behaves exactly like a fresh one, which means it can be dropped
+    without losing any state. Memory stays bounded by max_keys.
+    """
+    
+    def __init__(
+        self,
+        max_requests: int,
+        period_seconds: int = 60,
+        max_keys: int = 100_000,
+        quotas: Optional[Dict[str, tuple]] = None
+    ):
         """
-        Initialize throttler.
+        Initialize keyed rate limiter.
         
         Args:
-            delay_seconds: Minimum delay between requests
+            max_requests: Default requests allowed per key
+            period_seconds: Default time period per key
+            max_keys: Upper bound on buckets kept in memory
+            quotas: Optional per-key overrides {key: (max_requests, period)}
         """
-        self.delay = delay_seconds
-        self.last_request = 0
-        self.lock = asyncio.Lock()
+        self.max_requests = max_requests
+        self.period = period_seconds
+        self.max_keys = max_keys
+        self.quotas = quotas or {}
+        self.buckets: OrderedDict = OrderedDict()
+        self.evicted = 0
     
-    async def wait(self):
-        """Wait if needed to maintain throttle."""
-        async with self.lock:
-            elapsed = time.time() - self.last_request
-            if elapsed < self.delay:
-                await asyncio.sleep(self.delay - elapsed)
-            self.last_request = time.time()
-
-
+    def limiter_for(self, key: str) -> RateLimiter:
+        """Return the bucket for a key, creating it if needed."""
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            self.buckets.move_to_end(key)
+            return bucket
+        
+        self._evict_idle()
+        if len(self.buckets) >= self.max_keys:
+            # Hard cap: drop the least recently used bucket
+            self.buckets.popitem(last=False)
+            self.evicted += 1
+        
+        max_requests, period = self.quotas.get(
+            key, (self.max_requests, self.period)
+        )
+        bucket = RateLimiter(max_requests, period)
+        self.buckets[key] = bucket
+        return bucket
+    
+    def _evict_idle(self, max_checks: int = 2):
+        """Drop a few idle buckets from the LRU end (amortized O(1))."""
+        now = time.monotonic()
+        for _ in range(max_checks):
+            if not self.buckets:
+                return
+            key, bucket = next(iter(self.buckets.items()))
+            if bucket.tat > now:
+                return
+            del self.buckets[key]
+            self.evicted += 1
+    
+    async def wait_if_needed(self, key: str):
+        """Wait if this key has reached its rate limit."""
+        delay = self.limiter_for(key).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    GCRA rate limiter shared by several processes.
+    
+    Each process with its own RateLimiter enforces the quota on its own,
+    so N workers together send N times too much. Here the TAT is a single
+    float in a shared memory segment, updated under a process-shared
+    lock. The lock is held only to read and write that one number (about
+    a microsecond), never while sleeping.
+    
+    Share it by passing it to multiprocessing.Process(args=...) - the
+    lock can only be inherited by child processes, not sent over a queue.
+    """
+    
+    __slots__ = ('lock', 'memory', 'state', 'owner')
+    
+    def __init__(self, max_requests: int, period_seconds: int = 60, burst: int = 1):
+        """
+        Initialize shared rate limiter.
+        
+        Args:
+            max_requests: Maximum requests allowed across all processes
+            period_seconds: Time period for the limit
+            burst: Back-to-back requests allowed after idling (see RateLimiter)
+        """
+        self.memory = shared_memory.SharedMemory(create=True, size=8)
+        self.state = self.memory.buf.cast('d')
+        # A 'spawn' lock works with both spawned and forked children
+        self.lock = multiprocessing.get_context('spawn').Lock()
+        self.owner = True
+        super().__init__(max_requests, period_seconds, burst)
+    
+    @property
+    def tat(self) -> float:
+        return self.state[0]
+    
+    @tat.setter
+    def tat(self, value: float):
+        self.state[0] = value
+    
+    def reserve(self) -> float:
+        """Reserve the next slot in the shared bucket; returns the wait."""
+        # time.monotonic() is system-wide, so all processes share one clock
+        with self.lock:
+            now = time.monotonic()
+            tat = self.state[0]
+            if tat < now:
+                tat = now
+            self.state[0] = tat + self.interval
+        return tat - self.tolerance - now
+    
+    def __reduce__(self):
+        # Pickled when a child process starts: it reattaches by name
+        return (_attach_shared_rate_limiter, (
+            self.max_requests, self.period, self.burst, self.memory.name, self.lock
+        ))
+    
+    def close(self):
+        """Detach from the segment; the creating process also deletes it."""
+        self.state.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def _attach_shared_rate_limiter(
+    max_requests: int,
+    period_seconds: float,
+    burst: int,
+    name: str,
+    lock
+) -> SharedRateLimiter:
+    """Open an existing SharedRateLimiter segment (in a child process)."""
+    limiter = SharedRateLimiter.__new__(SharedRateLimiter)
+    limiter.max_requests = max_requests
+    limiter.period = period_seconds
+    limiter.burst = burst
+    limiter.interval = period_seconds / max_requests
+    limiter.tolerance = (burst - 1) * limiter.interval
+    limiter.memory = shared_memory.SharedMemory(name=name)
+    limiter.state = limiter.memory.buf.cast('d')
+    limiter.lock = lock
+    limiter.owner = False
+    return limiter
+
+
+def host_key(url: str) -> str:
+    """Rate-limit key for a URL: its host name.
+    
+    Matches aiohttp's own host_port_subcomponent (the name RequestTracer's
+    trace callbacks see), so default ports are dropped and user:pass never
+    ends up in a key or in the stats output.
+    """
+    return URL(url).host_port_subcomponent or ''
+
+
+async def rate_limited_fetch(
+    session: aiohttp.ClientSession,
+    limiter: Union[RateLimiter, KeyedRateLimiter],
+    url: str,
+    key: Optional[str] = None
+) -> str:
+    """
+    Fetch URL with rate limiting.
+    
+    With a KeyedRateLimiter the bucket is chosen by `key`, or by the
+    URL's host when no key is given.
+    """
+    host = host_key(url)
+    started = time.perf_counter()
+    if isinstance(limiter, KeyedRateLimiter):
+        await limiter.wait_if_needed(key or host)
+    else:
+        await limiter.wait_if_needed()
+    started = request_tracer.record_since(host, 'rate_limit', started)
+    async with session.get(url) as response:
+        text = await response.text()
+    request_tracer.record_since(host, 'total', started)
+    return text
+
+
+class Throttler:
+    """
+    Throttle requests to one time slot every `delay` seconds.
+    
+    Callers queue by priority class, then arrival order. One timer on
+    the loop's monotonic clock hands the next time slot to the most
+    urgent waiter, so an interactive request waits at most one slot
+    even behind thousands of queued batch requests. Nobody sleeps while
+    holding a lock, and a cancelled caller never uses up a slot.
+    """
+    
+    INTERACTIVE = 0
+    BATCH = 10
+    MAX_CATCH_UP = 0.01  # Seconds of missed slots granted at once after a stall
+    
+    def __init__(self, delay_seconds: float = 1.0):
+        """
+        Initialize throttler.
+        
+        Args:
+            delay_seconds: Spacing between request slots
+        """
+        self.delay = delay_seconds
+        self.next_slot = 0.0    # Loop time of the next free slot
+        self.waiters: List[tuple] = []  # Heap of (priority, order, future)
+        self.order = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.granted = 0
+        self.cancelled = 0
+        self.returned = 0
+    
+    async def wait(self, priority: int = INTERACTIVE):
+        """
+        Wait for a slot (lower priority numbers go first).
+        
+        Args:
+            priority: Throttler.INTERACTIVE, Throttler.BATCH or any int
+        """
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        now = loop.time()
+        if not self.waiters and now >= self.next_slot:
+            # Nobody queued and the slot is free: take it right away
+            self.next_slot = now + self.delay
+            self.granted += 1
+            return
+        
+        future = loop.create_future()
+        self.order += 1
+        heapq.heappush(self.waiters, (priority, self.order, future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted, but cancelled before we could use it
+                self._give_back(future.result())
+            else:
+                self.cancelled += 1
+                self._drop_cancelled()
+            raise
+    
+    def _schedule(self):
+        if self.timer is None and self.waiters:
+            self.timer = self.loop.call_at(self.next_slot, self._dispatch)
+    
+    def _dispatch(self):
+        """Timer callback: give each due slot to the most urgent waiter."""
+        self.timer = None
+        now = self.loop.time()
+        if self.next_slot < now - self.MAX_CATCH_UP:
+            self.next_slot = now  # A long stall is not made up as a burst
+        # Slots stay on a fixed schedule, so a late timer (the loop's clock
+        # is only ~1ms precise) doesn't push every later slot back
+        while self.waiters and self.next_slot <= now:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.cancelled():
+                continue  # Its place in the queue is simply skipped
+            slot = self.next_slot
+            self.next_slot = slot + self.delay
+            self.granted += 1
+            future.set_result(slot)
+        self._schedule()
+    
+    def _give_back(self, slot: float):
+        """Return an unused slot, if no later slot was handed out yet."""
+        if self.next_slot == slot + self.delay:
+            self.next_slot = slot
+            self.granted -= 1
+            self.returned += 1
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self._schedule()
+    
+    def _drop_cancelled(self):
+        # Cancelled entries are skipped when popped; rebuild the heap only
+        # if they pile up, so cancelling stays O(1) on average
+        if len(self.waiters) > 64 and self.cancelled % 64 == 0:
+            self.waiters = [entry for entry in self.waiters if not entry[2].cancelled()]
+            heapq.heapify(self.waiters)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'granted': self.granted,
+            'cancelled': self.cancelled,
+            'returned': self.returned,
+            'waiting': sum(1 for entry in self.waiters if not entry[2].cancelled())
+        }
+
+
 async def throttled_fetch(
     session: aiohttp.ClientSession,
     throttler: Throttler,
-    url: str
+    url: str,
+    priority: int = Throttler.INTERACTIVE
 ) -> str:
-    """Fetch URL with throttling."""
-    await throttler.wait()
+    """Fetch URL with throttling (pass Throttler.BATCH for bulk work)."""
+    host = host_key(url)
+    started = time.perf_counter()
+    await throttler.wait(priority)
+    started = request_tracer.record_since(host, 'throttle', started)
     async with session.get(url) as response:
-        return await response.text()
+        text = await response.text()
+    request_tracer.record_since(host, 'total', started)
+    return text
 
 
 # ============================================================================
@@ -498,63 +1839,761 @@ async def throttled_fetch(
 """
 Retry failed requests with exponential backoff
 Handles temporary network issues gracefully
+
+Plain `backoff_factor ** attempt` makes every client retry at the same
+moments, so they hit a recovering server in synchronized waves. Good
+retry policies:
+1. Add jitter ("decorrelated jitter" spreads retries out randomly)
+2. Honour the server's Retry-After header on 429/503
+3. Cap retries globally with a retry budget, so retries can never be
+   more than a small fraction of total traffic during an outage
+"""
+
+class RetryBudget:
+    """
+    Token bucket that limits retries to a fraction of requests.
+    
+    Every request deposits `ratio` tokens and every retry spends one.
+    A small per-second allowance keeps low-traffic clients able to retry.
+    """
+    
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        min_retries_per_second: float = 10,
+        max_tokens: float = 100
+    ):
+        """
+        Initialize retry budget.
+        
+        Args:
+            ratio: Retries allowed per request (0.1 = 10% extra load)
+            min_retries_per_second: Retries always allowed per second
+            max_tokens: Maximum saved-up retries
+        """
+        self.ratio = ratio
+        self.min_rate = min_retries_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.updated) * self.min_rate)
+        self.updated = now
+    
+    def record_request(self):
+        """Deposit tokens for one new (non-retry) request."""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+    
+    def try_spend(self) -> bool:
+        """Take one token for a retry; False means the budget is used up."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RetryStats:
+    """Per-attempt counters shared by every fetch using a policy."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.retry_after_used = 0
+        self.gave_up = 0
+        self.outcomes: Dict[str, int] = {}  # Status code or error name
+        self.attempt_seconds = 0.0
+    
+    def record_attempt(self, outcome: Union[int, str], seconds: float):
+        self.attempts += 1
+        self.attempt_seconds += seconds
+        outcome = str(outcome)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'budget_exhausted': self.budget_exhausted,
+            'retry_after_used': self.retry_after_used,
+            'gave_up': self.gave_up,
+            'outcomes': dict(self.outcomes),
+            'avg_attempt_seconds': self.attempt_seconds / self.attempts if self.attempts else 0.0
+        }
+
+
+retry_budget = RetryBudget()
+retry_stats = RetryStats()
+
+
+"""
+CIRCUIT BREAKERS
+
+When a host is down, retrying just piles more stuck requests onto the
+event loop and the connection pool. A circuit breaker watches the recent
+failure rate per host:
+- CLOSED: requests flow normally
+- OPEN: too many failures - fail fast without touching the network
+- HALF_OPEN: after a cool-down, let a few probe requests through;
+  if they succeed close the circuit, otherwise open it again
+"""
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while a circuit is open."""
+    
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit for {name} is open (retry in {retry_in:.1f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def log_state_change(name: str, old_state: str, new_state: str):
+    """Default breaker listener: print every state change."""
+    print(f"Circuit {name}: {old_state} -> {new_state}")
+
+
+class CircuitBreaker:
+    """Circuit breaker over a sliding window of the last N calls."""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 3,
+        listeners: Optional[List[Callable[[str, str, str], None]]] = None
+    ):
+        """
+        Initialize circuit breaker.
+        
+        Args:
+            name: Name used in errors and events (usually the host)
+            failure_rate_threshold: Failure fraction that opens the circuit
+            window_size: Number of recent calls the rate is computed over
+            minimum_calls: Calls needed in the window before it can open
+            open_seconds: Cool-down before probing a failed host again
+            half_open_max_calls: Probes allowed (and successes needed)
+                while half-open
+            listeners: Called as listener(name, old_state, new_state)
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.listeners = listeners if listeners is not None else []
+        self.window: deque = deque(maxlen=window_size)  # True = failure
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+        self.transitions = 0
+        self.rejected = 0
+    
+    def _transition(self, new_state: str):
+        old_state, self.state = self.state, new_state
+        self.transitions += 1
+        self.window.clear()
+        self.failures = 0
+        self.probes = 0
+        self.probe_successes = 0
+        if new_state == self.OPEN:
+            self.opened_at = time.monotonic()
+        for listener in self.listeners:
+            listener(self.name, old_state, new_state)
+    
+    def allow_request(self):
+        """Raise CircuitOpenError if a request must not be sent now."""
+        if self.state == self.CLOSED:
+            return
+        now = time.monotonic()
+        retry_at = self.opened_at + self.open_seconds
+        if self.state == self.OPEN:
+            if now < retry_at:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, retry_at - now)
+            self._transition(self.HALF_OPEN)
+            self.opened_at = now  # Start of this probe period
+        elif now >= retry_at:
+            # Probes never reported back (e.g. cancelled): allow a new batch
+            self.opened_at = now
+            self.probes = 0
+        if self.probes >= self.half_open_max_calls:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.opened_at + self.open_seconds - now)
+        self.probes += 1
+    
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_max_calls:
+                self._transition(self.CLOSED)
+        elif self.state == self.CLOSED:
+            self._record(False)
+    
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+        elif self.state == self.CLOSED:
+            self._record(True)
+            if (
+                len(self.window) >= self.minimum_calls
+                and self.failures / len(self.window) >= self.failure_rate_threshold
+            ):
+                self._transition(self.OPEN)
+    
+    def record_status(self, status: int):
+        """Record an HTTP response: 5xx counts as a failure."""
+        if status >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+    
+    def _record(self, failed: bool):
+        if len(self.window) == self.window.maxlen and self.window[0]:
+            self.failures -= 1
+        self.window.append(failed)
+        self.failures += failed
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'failure_rate': self.failures / len(self.window) if self.window else 0.0,
+            'calls_in_window': len(self.window),
+            'transitions': self.transitions,
+            'rejected': self.rejected
+        }
+
+
+class CircuitBreakerRegistry:
+    """Lazily creates one CircuitBreaker per host."""
+    
+    def __init__(
+        self,
+        listeners: Optional[List[Callable[[str, str, str], None]]] = None,
+        **breaker_options
+    ):
+        """
+        Initialize registry.
+        
+        Args:
+            listeners: State-change listeners shared by every breaker
+            **breaker_options: Passed to each new CircuitBreaker
+        """
+        self.listeners = listeners if listeners is not None else [log_state_change]
+        self.breaker_options = breaker_options
+        self.breakers: Dict[str, CircuitBreaker] = {}
+    
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, listeners=self.listeners, **self.breaker_options)
+            self.breakers[host] = breaker
+        return breaker
+    
+    def for_url(self, url: str) -> CircuitBreaker:
+        return self.get(host_key(url))
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {host: breaker.snapshot() for host, breaker in self.breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
+
+
+"""
+ADAPTIVE CONCURRENCY
+
+A fixed limit on requests in flight is wrong for someone: too low wastes
+throughput, too high piles requests up in the server's queue until it
+answers 429. Like TCP congestion control, the limiter below finds the
+limit by watching the results:
+- While latency stays near its usual level, raise the limit a little
+- When latency inflates (the server is queueing), lower it in
+  proportion ("gradient" = usual latency / current latency)
+- On 429, 5xx or a network error, cut it multiplicatively (AIMD)
+
+It is opt-in: pass adaptive=True to fetch_url() / fetch_with_retry().
+Without it only the session's connection limits apply.
 """
 
+class AdaptiveConcurrencyLimiter:
+    """Limit on in-flight requests to one host that adjusts itself."""
+    
+    def __init__(
+        self,
+        name: str = 'default',
+        initial_limit: float = 10,
+        min_limit: float = 1,
+        max_limit: float = 200,
+        backoff_ratio: float = 0.5,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2
+    ):
+        """
+        Initialize adaptive limiter.
+        
+        Args:
+            name: Label used in snapshots (usually the host)
+            initial_limit: Requests in flight allowed at first
+            min_limit: Never go below this
+            max_limit: Never go above this
+            backoff_ratio: Multiply the limit by this on 429/5xx/errors
+            tolerance: Latency inflation accepted before shrinking
+                (1.5 = up to 50% slower than usual)
+            smoothing: How quickly the limit follows the latency signal
+        """
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.inflight = 0
+        self.waiters: deque = deque()
+        self.short_rtt = 0.0    # Recent latency (fast average)
+        self.long_rtt = 0.0     # Usual latency (slow average)
+        self.last_backoff = 0.0
+        self.backoffs = 0
+        self.samples = 0
+    
+    def slot(self) -> 'ConcurrencySlot':
+        """async with limiter.slot() as slot: ... slot.status = response.status"""
+        return ConcurrencySlot(self)
+    
+    async def acquire(self) -> float:
+        """Wait for an in-flight slot; returns the start time for release()."""
+        if self.inflight < self.limit and not self.waiters:
+            self.inflight += 1
+            return time.monotonic()
+        
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Handed a slot, but cancelled before we could use it
+                self.inflight -= 1
+                self._wake()
+            raise
+        return time.monotonic()
+    
+    def release(self, started: float, status: Optional[int] = None, error: bool = False):
+        """
+        Free a slot and learn from how the request went.
+        
+        Args:
+            started: Value returned by acquire()
+            status: HTTP status, if a response arrived
+            error: True for network errors and timeouts
+        """
+        self.inflight -= 1
+        if error or status == 429 or (status is not None and status >= 500):
+            self._back_off(started)
+        elif status is not None:
+            self._sample(time.monotonic() - started)
+        self._wake()
+    
+    def _wake(self):
+        while self.waiters and self.inflight < self.limit:
+            future = self.waiters.popleft()
+            if future.cancelled():
+                continue
+            self.inflight += 1
+            future.set_result(None)
+    
+    def _back_off(self, started: float):
+        # Requests sent before the last cut all fail together; cut once
+        if started < self.last_backoff:
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        self.last_backoff = time.monotonic()
+        self.backoffs += 1
+    
+    def _sample(self, rtt: float):
+        self.samples += 1
+        if not self.short_rtt:
+            self.short_rtt = self.long_rtt = rtt
+            return
+        self.short_rtt += 0.1 * (rtt - self.short_rtt)
+        if self.short_rtt < self.long_rtt:
+            self.long_rtt = self.short_rtt  # Faster than usual: new baseline
+        else:
+            # Drift up over a few thousand responses, so queueing we
+            # cause ourselves does not quietly become the new "usual"
+            self.long_rtt += 0.0005 * (self.short_rtt - self.long_rtt)
+        
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        if gradient == 1.0 and self.inflight < self.limit / 2:
+            return  # Not using the limit, so no evidence it could be higher
+        
+        # Move part way towards limit * gradient, plus a little headroom:
+        # about sqrt(limit) per round trip, i.e. 1/sqrt(limit) per response
+        limit = self.limit + self.smoothing * (self.limit * gradient - self.limit)
+        limit += 1 / math.sqrt(self.limit)
+        self.limit = min(self.max_limit, max(self.min_limit, limit))
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'limit': round(self.limit, 2),
+            'inflight': self.inflight,
+            'waiting': len(self.waiters),
+            'short_rtt': self.short_rtt,
+            'long_rtt': self.long_rtt,
+            'backoffs': self.backoffs,
+            'samples': self.samples
+        }
+
+
+class ConcurrencySlot:
+    """One in-flight request; see AdaptiveConcurrencyLimiter.slot()."""
+    
+    __slots__ = ('limiter', 'started', 'status')
+    
+    def __init__(self, limiter: Optional[AdaptiveConcurrencyLimiter]):
+        self.limiter = limiter  # None = no limit
+        self.started = 0.0
+        self.status: Optional[int] = None
+    
+    async def __aenter__(self) -> 'ConcurrencySlot':
+        if self.limiter is None:
+            self.started = time.monotonic()
+        else:
+            self.started = await self.limiter.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.limiter is None:
+            return
+        error = exc_type is not None and issubclass(
+            exc_type, (aiohttp.ClientError, asyncio.TimeoutError)
+        )
+        self.limiter.release(self.started, self.status, error)
+
+
+class AdaptiveLimiterRegistry:
+    """Lazily creates one AdaptiveConcurrencyLimiter per host."""
+    
+    def __init__(self, **limiter_options):
+        """
+        Initialize registry.
+        
+        Args:
+            **limiter_options: Passed to each new AdaptiveConcurrencyLimiter
+        """
+        self.limiter_options = limiter_options
+        self.limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+    
+    def get(self, host: str) -> AdaptiveConcurrencyLimiter:
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = AdaptiveConcurrencyLimiter(host, **self.limiter_options)
+            self.limiters[host] = limiter
+        return limiter
+    
+    def for_url(self, url: str) -> AdaptiveConcurrencyLimiter:
+        return self.get(host_key(url))
+    
+    def slot(self, url: str, adaptive: bool = True) -> ConcurrencySlot:
+        """Slot under the URL host's limit (adaptive=False: no limit)."""
+        return ConcurrencySlot(self.for_url(url) if adaptive else None)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {host: limiter.snapshot() for host, limiter in self.limiters.items()}
+
+
+adaptive_limits = AdaptiveLimiterRegistry()
+
+
+class RetryPolicy:
+    """When and how long to wait before retrying a request."""
+    
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        retry_statuses: tuple = (429, 500, 502, 503, 504),
+        max_retry_after: float = 60.0,
+        budget: Optional[RetryBudget] = None,
+        stats: Optional[RetryStats] = None
+    ):
+        """
+        Initialize retry policy.
+        
+        Args:
+            max_attempts: Total attempts including the first one
+            base_delay: Smallest backoff delay in seconds
+            max_delay: Largest backoff delay in seconds
+            retry_statuses: HTTP statuses worth retrying
+            max_retry_after: Ignore Retry-After values longer than this
+            budget: Shared retry budget (default: module-wide budget)
+            stats: Where to record metrics (default: module-wide stats)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.max_retry_after = max_retry_after
+        self.budget = budget or retry_budget
+        self.stats = stats or retry_stats
+    
+    def next_delay(self, previous: float) -> float:
+        """Decorrelated jitter: random between base and 3x the last delay."""
+        return min(self.max_delay, random.uniform(self.base_delay, previous * 3))
+    
+    def retry_after(self, header: Optional[str]) -> Optional[float]:
+        """Parse a Retry-After header (seconds or HTTP date)."""
+        if not header:
+            return None
+        try:
+            seconds = float(header)
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(header)
+            except (TypeError, ValueError):
+                return None
+            seconds = when.timestamp() - time.time()
+        if seconds > self.max_retry_after:
+            return None
+        return max(0.0, seconds)
+    
+    def allow_retry(self) -> bool:
+        """Ask the budget for a retry and record the outcome."""
+        if self.budget.try_spend():
+            self.stats.retries += 1
+            return True
+        self.stats.budget_exhausted += 1
+        return False
+
+
 async def fetch_with_retry(
     session: aiohttp.ClientSession,
     url: str,
     max_retries: int = 3,
-    backoff_factor: float = 2.0
+    backoff_factor: float = 2.0,
+    policy: Optional[RetryPolicy] = None,
+    breakers: Optional[CircuitBreakerRegistry] = None,
+    limits: Optional[AdaptiveLimiterRegistry] = None,
+    adaptive: bool = False
 ) -> Optional[Dict]:
     """
-    Fetch URL with retry logic and exponential backoff.
-    
+    Fetch URL with retry logic and jittered exponential backoff.
+
     Args:
         session: aiohttp ClientSession
         url: URL to fetch
-        max_retries: Maximum number of retry attempts
-        backoff_factor: Multiplier for backoff delay
+        max_retries: Maximum number of attempts (ignored if policy given)
+        backoff_factor: Backoff growth; caps the delay at
+            backoff_factor ** max_retries (ignored if policy given)
+        policy: RetryPolicy with jitter, Retry-After and retry budget
+        breakers: Circuit breakers per host (default: module-wide)
+        limits: Adaptive concurrency limits per host (default: module-wide)
+        adaptive: Opt in to the adaptive limit (default: only the
+            session's connection limits apply)
     
     Returns:
         Response data or None if all retries failed
+    
+    Raises:
+        CircuitOpenError: The host's circuit is open (fails fast)
+    """
+    if policy is None:
+        policy = RetryPolicy(
+            max_attempts=max_retries,
+            max_delay=backoff_factor ** max_retries
+        )
+    policy.stats.requests += 1
+    policy.budget.record_request()
+    
+    breaker = (breakers or circuit_breakers).for_url(url)
+    limits = limits or adaptive_limits
+    
+    delay = policy.base_delay
+    last_attempt = policy.max_attempts - 1
+    for attempt in range(policy.max_attempts):
+        breaker.allow_request()
+        started = time.monotonic()
+        try:
+            async with limits.slot(url, adaptive) as slot:
+                started = slot.started
+                traced = time.perf_counter()
+                async with session.get(url) as response:
+                    slot.status = response.status
+                    policy.stats.record_attempt(response.status, time.monotonic() - started)
+                    
+                    # Handle rate limiting and server errors (retry)
+                    if response.status in policy.retry_statuses:
+                        breaker.record_status(response.status)
+                        if attempt == last_attempt or not policy.allow_retry():
+                            policy.stats.gave_up += 1
+                            if response.status >= 500:
+                                raise Exception(f"Server error {response.status}")
+                            return None
+                        
+                        delay = policy.next_delay(delay)
+                        wait_time = policy.retry_after(response.headers.get('Retry-After'))
+                        if wait_time is not None:
+                            policy.stats.retry_after_used += 1
+                        else:
+                            wait_time = delay
+                        print(f"HTTP {response.status}. Retrying in {wait_time:.1f}s...")
+                    
+                    # Handle client errors (don't retry)
+                    elif response.status >= 400:
+                        breaker.record_status(response.status)
+                        raise Exception(f"Client error {response.status}: {response.reason}")
+                    
+                    # Success (recorded once the body decoded)
+                    else:
+                        data = await read_json(response)
+                        breaker.record_status(response.status)
+                        request_tracer.record_since(breaker.name, 'total', traced)
+                        return data
+        
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            policy.stats.record_attempt(type(e).__name__, time.monotonic() - started)
+            breaker.record_failure()
+            if attempt < last_attempt and policy.allow_retry():
+                delay = policy.next_delay(delay)
+                wait_time = delay
+                print(f"Request failed: {e}. Retrying in {delay:.1f}s...")
+            else:
+                policy.stats.gave_up += 1
+                print(f"All {attempt + 1} attempts failed: {e}")
+                return None
+        
+        # Back off outside the request, so neither the connection nor
+        # the concurrency slot is held while we wait
+        request_tracer.record(breaker.name, 'backoff', wait_time)
+        await asyncio.sleep(wait_time)
+    
+    return None
+
+
+async def fetch_json_stream(
+    session: aiohttp.ClientSession,
+    url: str,
+    policy: Optional[RetryPolicy] = None,
+    breakers: Optional[CircuitBreakerRegistry] = None,
+    loads: Optional[Callable[[bytes], Any]] = None,
+    chunk_size: int = 64 * 1024
+) -> AsyncIterator[Any]:
     """
-    for attempt in range(max_retries):
+    Streaming version of fetch_with_retry() for JSON array endpoints.
+    
+    Elements are yielded one at a time as they are parsed, so peak memory
+    is about one chunk plus the largest element. Failures are retried
+    only until the first element is yielded - after that a retry would
+    repeat elements, so the error is raised instead.
+    
+    Args:
+        session: aiohttp ClientSession
+        url: URL returning a JSON array
+        policy: RetryPolicy (default: RetryPolicy())
+        breakers: Circuit breakers per host (default: module-wide)
+        loads: Decoder for one element (default: the json_loads hook)
+        chunk_size: Bytes read from the connection at a time
+    
+    Raises:
+        CircuitOpenError: The host's circuit is open (fails fast)
+        Exception: Error status, or the last network error after retries
+    """
+    policy = policy or RetryPolicy()
+    policy.stats.requests += 1
+    policy.budget.record_request()
+    
+    breaker = (breakers or circuit_breakers).for_url(url)
+    
+    delay = policy.base_delay
+    last_attempt = policy.max_attempts - 1
+    yielded = False
+    for attempt in range(policy.max_attempts):
+        breaker.allow_request()
+        started = time.monotonic()
+        traced = time.perf_counter()
         try:
             async with session.get(url) as response:
-                # Handle rate limiting
-                if response.status == 429:
-                    wait_time = backoff_factor ** attempt
-                    print(f"Rate limited. Waiting {wait_time:.1f}s...")
-                    await asyncio.sleep(wait_time)
-                    continue  # Retry
-                
-                # Handle server errors (retry)
-                if response.status >= 500:
-                    if attempt < max_retries - 1:
-                        wait_time = backoff_factor ** attempt
-                        print(f"Server error {response.status}. Retrying in {wait_time:.1f}s...")
-                        await asyncio.sleep(wait_time)
-                        continue
+                policy.stats.record_attempt(response.status, time.monotonic() - started)
+
+                if response.status in policy.retry_statuses:
+                    breaker.record_status(response.status)
+                    if attempt == last_attempt or not policy.allow_retry():
+                        policy.stats.gave_up += 1
+                        raise Exception(f"HTTP {response.status} after {attempt + 1} attempts")
+                    
+                    delay = policy.next_delay(delay)
+                    wait_time = policy.retry_after(response.headers.get('Retry-After'))
+                    if wait_time is not None:
+                        policy.stats.retry_after_used += 1
                     else:
-                        raise Exception(f"Server error {response.status}")
+                        wait_time = delay
+                    print(f"HTTP {response.status}. Retrying in {wait_time:.1f}s...")
                 
-                # Handle client errors (don't retry)
-                if response.status >= 400:
+                elif response.status >= 400:
+                    breaker.record_status(response.status)
                     raise Exception(f"Client error {response.status}: {response.reason}")
                 
-                # Success
-                return await response.json()
-                
+                else:
+                    # The request counts as a success once the first element
+                    # parsed; only failures before that are recorded
+                    async for item in iter_json_array(response, loads, chunk_size):
+                        if not yielded:
+                            breaker.record_success()
+                            yielded = True
+                        yield item
+                    if not yielded:
+                        breaker.record_success()  # Empty array
+                    request_tracer.record_since(breaker.name, 'total', traced)
+                    return
+        
         except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            if attempt < max_retries - 1:
-                wait_time = backoff_factor ** attempt
-                print(f"Request failed: {e}. Retrying in {wait_time:.1f}s...")
-                await asyncio.sleep(wait_time)
-            else:
-                print(f"All {max_retries} retries failed: {e}")
-                return None
+            policy.stats.record_attempt(type(e).__name__, time.monotonic() - started)
+            if not yielded:
+                breaker.record_failure()
+            if yielded or attempt == last_attempt or not policy.allow_retry():
+                policy.stats.gave_up += 1
+                raise
+            delay = policy.next_delay(delay)
+            wait_time = delay
+            print(f"Request failed: {e}. Retrying in {delay:.1f}s...")
+        
+        # Back off outside the response, so the connection is not held
+        request_tracer.record(breaker.name, 'backoff', wait_time)
+        await asyncio.sleep(wait_time)
+
+
+async def stream_example():
+    """Stream 5000 photos without holding the whole list in memory."""
+    print("\n--- STREAMING JSON EXAMPLE ---")
     
-    return None
+    url = 'https://jsonplaceholder.typicode.com/photos'
+    albums = set()
+    count = 0
+    
+    async with http_sessions as session:
+        photos = fetch_json_stream(session, url)
+        async with aclosing(photos):
+            async for photo in photos:
+                count += 1
+                albums.add(photo['albumId'])
+    
+    print(f"Streamed {count} photos from {len(albums)} albums")
+    return count
 
 
 # ============================================================================
@@ -567,17 +2606,17 @@ Use asyncio.timeout or asyncio.wait_for
 """
 
 async def fetch_with_timeout(
-    session: aiohttp.ClientSession,
+    session: Optional[aiohttp.ClientSession],
     url: str,
     timeout_seconds: float = 5.0
 ) -> Optional[Dict]:
-    """Fetch with timeout protection."""
+    """Fetch with timeout protection (uses the shared session if None)."""
+    session = session or get_session()
     try:
-        # Set timeout for the entire request
+        # Per-request timeout - no need for a new session
         timeout = aiohttp.ClientTimeout(total=timeout_seconds)
-        async with aiohttp.ClientSession(timeout=timeout) as new_session:
-            async with new_session.get(url) as response:
-                return await response.json()
+        async with session.get(url, timeout=timeout) as response:
+            return await read_json(response)
     except asyncio.TimeoutError:
         print(f"Request timed out after {timeout_seconds}s")
         return None
@@ -595,7 +2634,7 @@ async def fetch_with_wait_for(
     try:
         async with session.get(url) as response:
             data = await asyncio.wait_for(
-                response.json(),
+                read_json(response),
                 timeout=timeout_seconds
             )
             return data
@@ -613,18 +2652,619 @@ Cache API responses to reduce API calls
 Useful when the same data is requested multiple times
 """
 
+class CacheEntry:
+    """A cached value plus the bookkeeping the cache needs."""
+    
+    __slots__ = ('value', 'stored_at', 'size', 'fetch_time')
+    
+    def __init__(
+        self,
+        value: Any,
+        stored_at: float,
+        size: int = 0,
+        fetch_time: float = 0.0
+    ):
+        self.value = value
+        self.stored_at = stored_at
+        self.size = size
+        self.fetch_time = fetch_time  # How long the fetch took (seconds)
+
+
+def approximate_size(value: Any, _depth: int = 0) -> int:
+    """Rough size in bytes of a JSON-like value (dicts, lists, scalars)."""
+    size = sys.getsizeof(value)
+    if _depth >= 4:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += approximate_size(k, _depth + 1)
+            size += approximate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += approximate_size(item, _depth + 1)
+    return size
+
+
+class LRUStore:
+    """
+    Least-recently-used storage with optional entry and byte limits.
+    
+    An OrderedDict keeps keys in access order, so get, set and eviction
+    are all O(1).
+    """
+    
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        on_evict: Optional[Callable[[str, Any, str], None]] = None
+    ):
+        """
+        Initialize LRU store.
+        
+        Args:
+            max_entries: Maximum number of entries (None = unbounded)
+            max_bytes: Approximate byte budget (None = unbounded)
+            on_evict: Called as on_evict(key, value, reason) on eviction
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+    
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """Look up an entry without counting it as an access."""
+        return self.entries.get(key)
+    
+    def set(self, key: str, entry: CacheEntry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size
+        self.entries[key] = entry
+        self.bytes += entry.size
+        while self._over_budget() and len(self.entries) > 1:
+            victim, victim_entry = self.entries.popitem(last=False)
+            self._evicted(victim, victim_entry, 'capacity')
+    
+    def pop(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+        return entry
+    
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+    
+    def _over_budget(self) -> bool:
+        return (
+            (self.max_entries is not None and len(self.entries) > self.max_entries)
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        )
+    
+    def _evicted(self, key: str, entry: CacheEntry, reason: str):
+        self.bytes -= entry.size
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key, entry.value, reason)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class FrequencySketch:
+    """
+    Count-Min sketch of recent access frequencies (used by TinyLFU).
+    
+    Counters saturate at 15 and are halved every `sample_size` increments,
+    so old popularity fades and memory stays fixed.
+    """
+    
+    __slots__ = ('width', 'mask', 'table', 'additions', 'sample_size')
+    
+    def __init__(self, capacity: int):
+        self.width = 1 << max(4, (capacity * 2 - 1).bit_length())
+        self.mask = self.width - 1
+        self.table = [bytearray(self.width) for _ in range(4)]
+        self.additions = 0
+        self.sample_size = 10 * max(capacity, 16)
+    
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F,
+             0x165667B19E3779F9, 0x27D4EB2F165667C5)
+    
+    def _indexes(self, key: str):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        for seed in self.SEEDS:
+            yield ((h * seed) >> 32) & self.mask
+    
+    def increment(self, key: str):
+        for row, index in zip(self.table, self._indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._reset()
+    
+    def frequency(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self.table, self._indexes(key)))
+    
+    def _reset(self):
+        """Halve every counter (amortized O(1) per increment)."""
+        for row in self.table:
+            row[:] = bytes(count >> 1 for count in row)
+        self.additions //= 2
+
+
+class TinyLFUStore(LRUStore):
+    """
+    W-TinyLFU storage: a small LRU "window" in front of a segmented LRU
+    main area, with a frequency sketch deciding admission.
+    
+    New keys enter the window. When the window overflows, its oldest key
+    only replaces the main area's eviction victim if it has been seen
+    more often, so one-off scans cannot flush out hot keys.
+    """
+    
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        on_evict: Optional[Callable[[str, Any, str], None]] = None
+    ):
+        super().__init__(max_entries, max_bytes, on_evict)
+        # With only a byte budget, size the sketch for 10k keys and let
+        # the byte limit do the evicting
+        capacity = max_entries or 10_000
+        self.window_max = max(1, capacity // 100)
+        self.main_max = max(1, capacity - self.window_max) if max_entries else float('inf')
+        self.protected_max = max(1, capacity * 8 // 10)
+        self.sketch = FrequencySketch(capacity)
+        # All three segments are LRU-ordered; self.entries maps key -> entry
+        self.window: OrderedDict = OrderedDict()
+        self.probation: OrderedDict = OrderedDict()
+        self.protected: OrderedDict = OrderedDict()
+    
+    def _segment(self, key: str) -> OrderedDict:
+        if key in self.window:
+            return self.window
+        if key in self.probation:
+            return self.probation
+        return self.protected
+    
+    def get(self, key: str) -> Optional[CacheEntry]:
+        # Count accesses here only: a miss is followed by set(), and
+        # counting both would start every one-off key at frequency 2
+        self.sketch.increment(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        segment = self._segment(key)
+        if segment is self.probation:
+            # Second hit: promote to protected, demoting its oldest if full
+            del self.probation[key]
+            self.protected[key] = None
+            if len(self.protected) > self.protected_max:
+                demoted, _ = self.protected.popitem(last=False)
+                self.probation[demoted] = None
+        else:
+            segment.move_to_end(key)
+        return entry
+    
+    def set(self, key: str, entry: CacheEntry):
+        old = self.entries.get(key)
+        self.entries[key] = entry
+        self.bytes += entry.size
+        if old is not None:
+            self.bytes -= old.size
+            self._segment(key).move_to_end(key)
+        else:
+            self.window[key] = None
+            if len(self.window) > self.window_max:
+                candidate, _ = self.window.popitem(last=False)
+                self._admit(candidate)
+        while self.max_bytes is not None and self.bytes > self.max_bytes:
+            if len(self.entries) <= 1 or not self._evict_one():
+                break
+    
+    def _admit(self, candidate: str):
+        """Move a key leaving the window into probation, or drop it."""
+        if len(self.probation) + len(self.protected) < self.main_max:
+            self.probation[candidate] = None
+            return
+        victims = self.probation or self.protected
+        victim = next(iter(victims))
+        if self.sketch.frequency(candidate) > self.sketch.frequency(victim):
+            del victims[victim]
+            self._evicted(victim, self.entries.pop(victim), 'capacity')
+            self.probation[candidate] = None
+        else:
+            self._evicted(candidate, self.entries.pop(candidate), 'capacity')
+    
+    def _evict_one(self) -> bool:
+        """Evict one key for the byte budget, coldest segment first."""
+        for segment in (self.probation, self.window, self.protected):
+            if segment:
+                victim, _ = segment.popitem(last=False)
+                self._evicted(victim, self.entries.pop(victim), 'capacity')
+                return True
+        return False
+    
+    def pop(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+            self._segment(key).pop(key, None)
+        return entry
+    
+    def clear(self):
+        super().clear()
+        self.window.clear()
+        self.probation.clear()
+        self.protected.clear()
+
+
+CACHE_POLICIES = {'lru': LRUStore, 'tinylfu': TinyLFUStore}
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel for expiring keys without scanning the cache.
+    
+    Each key lives in the bucket for the tick at which it expires, so
+    scheduling, cancelling and expiring a key are all O(1). advance()
+    only visits the buckets for ticks that have passed since last time.
+    """
+    
+    def __init__(self, resolution: float = 1.0):
+        """
+        Initialize timer wheel.
+        
+        Args:
+            resolution: Tick length in seconds (expiry precision)
+        """
+        self.resolution = resolution
+        self.buckets: Dict[int, set] = {}
+        self.key_ticks: Dict[str, int] = {}
+        self.current_tick = int(time.monotonic() / resolution)
+    
+    def schedule(self, key: str, when: float):
+        """Expire `key` at monotonic time `when` (rescheduling if needed)."""
+        tick = max(math.ceil(when / self.resolution), self.current_tick + 1)
+        old_tick = self.key_ticks.get(key)
+        if old_tick == tick:
+            return
+        if old_tick is not None:
+            self._discard(key, old_tick)
+        self.buckets.setdefault(tick, set()).add(key)
+        self.key_ticks[key] = tick
+    
+    def cancel(self, key: str):
+        """Forget a key's timer."""
+        tick = self.key_ticks.pop(key, None)
+        if tick is not None:
+            self._discard(key, tick)
+    
+    def _discard(self, key: str, tick: int):
+        bucket = self.buckets.get(tick)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[tick]
+    
+    def advance(self, now: float) -> List[str]:
+        """Return every key whose tick has passed, removing its timer."""
+        now_tick = int(now / self.resolution)
+        if now_tick - self.current_tick > len(self.buckets):
+            # Long idle gap: visiting the few live buckets is cheaper
+            ticks = sorted(t for t in self.buckets if t <= now_tick)
+        else:
+            ticks = range(self.current_tick + 1, now_tick + 1)
+        self.current_tick = max(self.current_tick, now_tick)
+        
+        due = []
+        for tick in ticks:
+            bucket = self.buckets.pop(tick, None)
+            if bucket:
+                for key in bucket:
+                    del self.key_ticks[key]
+                due.extend(bucket)
+        return due
+    
+    def clear(self):
+        self.buckets.clear()
+        self.key_ticks.clear()
+    
+    def __len__(self) -> int:
+        return len(self.key_ticks)
+
+
+# Disk tier values are JSON. Dataclasses defined in this module (such as
+# WeatherReport) are written as {"__dataclass__": name, ...fields} and
+# rebuilt on the way back; any other non-JSON value is refused.
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'week9_cache.sqlite3')
+
+
+def _encode_cached(obj: Any) -> Dict:
+    """json.dumps hook: tag this module's dataclasses with their class name."""
+    cls = type(obj)
+    if is_dataclass(obj) and globals().get(cls.__name__) is cls:
+        values = {field.name: getattr(obj, field.name) for field in fields(obj)}
+        return {'__dataclass__': cls.__name__, **values}
+    raise TypeError(f"{cls.__name__} values cannot be stored in the disk cache")
+
+
+def _decode_cached(obj: Dict) -> Any:
+    """json.loads hook: rebuild objects tagged by _encode_cached."""
+    name = obj.pop('__dataclass__', None)
+    if name is None:
+        return obj
+    cls = globals().get(name)
+    if not (isinstance(cls, type) and is_dataclass(cls)):
+        raise ValueError(f"Unknown cached dataclass {name!r}")
+    return cls(**obj)
+
+
+def cache_dumps(value: Any) -> str:
+    """Serialize a disk cache value (JSON plus tagged dataclasses)."""
+    return json.dumps(value, default=_encode_cached)
+
+
+def cache_loads(payload: str) -> Any:
+    """Inverse of cache_dumps."""
+    return json.loads(payload, object_hook=_decode_cached)
+
+
+class SQLiteCacheTier:
+    """
+    Persistent second cache tier stored in a local SQLite file.
+    
+    All SQLite work runs on one dedicated worker thread, so reads and
+    writes never block the event loop. Expiry times are stored as wall
+    clock timestamps because the monotonic clock restarts with the process.
+    """
+    
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        compact_interval: float = 300,
+        dumps: Callable[[Any], str] = cache_dumps,
+        loads: Callable[[str], Any] = cache_loads
+    ):
+        """
+        Initialize disk tier.
+        
+        Args:
+            path: SQLite database file (default: next to this module, not the CWD)
+            compact_interval: Seconds between background compactions
+            dumps: Serializer for stored values (default: JSON with dataclasses)
+            loads: Deserializer for stored values
+        """
+        self.path = path
+        self.compact_interval = compact_interval
+        self.dumps = dumps
+        self.loads = loads
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-disk')
+        self.conn: Optional[sqlite3.Connection] = None
+        self.compaction_task: Optional[asyncio.Task] = None
+        self.compactions = 0
+    
+    async def _run(self, fn, *args):
+        """Run a blocking SQLite call on the tier's worker thread."""
+        if self.compaction_task is None:
+            self.start_compaction()  # First use, so we are in a running loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)"
+            )
+            conn.commit()
+            self.conn = conn
+        return self.conn
+    
+    def _get(self, key: str):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row
+    
+    def _set(self, key: str, payload: str, ttl: float):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, payload, now, now + ttl)
+        )
+        conn.commit()
+    
+    def _delete(self, key: Optional[str]):
+        conn = self._connect()
+        if key is None:
+            conn.execute("DELETE FROM cache")
+        else:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        conn.commit()
+    
+    def _load_recent(self, limit: int):
+        return self._connect().execute(
+            "SELECT key, value, expires_at FROM cache WHERE expires_at > ?"
+            " ORDER BY stored_at DESC LIMIT ?",
+            (time.time(), limit)
+        ).fetchall()
+    
+    def _compact(self) -> int:
+        conn = self._connect()
+        removed = conn.execute(
+            "DELETE FROM cache WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        conn.commit()
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+    
+    async def get(self, key: str) -> Optional[tuple]:
+        """Return (value, seconds_left) or None if missing/expired."""
+        row = await self._run(self._get, key)
+        if row is None:
+            return None
+        payload, expires_at = row
+        return self.loads(payload), expires_at - time.time()
+    
+    async def set(self, key: str, value: Any, ttl: float):
+        """Persist a value for `ttl` seconds."""
+        try:
+            payload = self.dumps(value)
+        except (TypeError, ValueError) as e:
+            raise TypeError(f"Cannot persist cache key {key!r}: {e}") from e
+        await self._run(self._set, key, payload, ttl)
+    
+    async def delete(self, key: Optional[str] = None):
+        """Delete one key, or everything when key is None."""
+        await self._run(self._delete, key)
+    
+    async def load_recent(self, limit: int = 1000) -> List[tuple]:
+        """Most recently stored live entries as (key, value, seconds_left)."""
+        rows = await self._run(self._load_recent, limit)
+        now = time.time()
+        return [(key, self.loads(payload), expires_at - now) for key, payload, expires_at in rows]
+    
+    async def compact(self) -> int:
+        """Delete expired rows and return the file space; returns rows removed."""
+        removed = await self._run(self._compact)
+        self.compactions += 1
+        return removed
+    
+    def start_compaction(self):
+        """Compact in the background every compact_interval seconds (automatic on first use)."""
+        if self.compaction_task is None or self.compaction_task.done():
+            self.compaction_task = asyncio.create_task(self._compaction_loop())
+    
+    async def _compaction_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except sqlite3.Error as e:
+                print(f"Cache compaction failed: {e}")
+    
+    async def close(self):
+        """Close the database and stop compaction."""
+        if self.conn is not None:
+            await self._run(self.conn.close)
+            self.conn = None
+        if self.compaction_task is not None:
+            self.compaction_task.cancel()
+            self.compaction_task = None
+        self.executor.shutdown(wait=False)
+
+
 class AsyncCache:
-    """Simple async cache for API responses."""
+    """
+    Simple async cache for API responses.
+    
+    Concurrent misses for the same key are coalesced ("single-flight"):
+    the first caller starts the fetch and everyone else awaits the same
+    in-flight task instead of hitting the upstream API again.
+    
+    Set max_entries and/or max_bytes to bound memory; the eviction policy
+    is 'lru' or 'tinylfu' (better hit rate when scans mix with hot keys).
     
-    def __init__(self, ttl_seconds: int = 300):
+    Stale-while-revalidate (stale_ttl_seconds > 0) returns an expired
+    value for a grace period while one background task refreshes it.
+    Early refresh (early_refresh_beta > 0) uses the "XFetch" rule to
+    renew hot keys shortly *before* they expire, more eagerly the
+    slower the upstream fetch was.
+    
+    With a disk_tier, memory misses are looked up on disk before calling
+    the fetcher, new values are written behind in the background, and
+    warm() preloads memory after a restart.
+    
+    TTLs are normally checked only on read. Set sweep_interval to also
+    evict expired keys proactively from one background task driven by
+    a TimerWheel, so keys that are never read again do not stay resident.
+    """
+    
+    def __init__(
+        self,
+        ttl_seconds: int = 300,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        policy: str = 'lru',
+        on_evict: Optional[Callable[[str, Any, str], None]] = None,
+        sizeof: Callable[[Any], int] = approximate_size,
+        stale_ttl_seconds: float = 0,
+        early_refresh_beta: float = 0,
+        disk_tier: Optional[SQLiteCacheTier] = None,
+        sweep_interval: Optional[float] = None
+    ):
         """
         Initialize cache.
         
         Args:
             ttl_seconds: Time to live for cached items
+            max_entries: Maximum number of cached keys (None = unbounded)
+            max_bytes: Approximate memory budget in bytes (None = unbounded)
+            policy: Eviction policy, 'lru' or 'tinylfu'
+            on_evict: Called as on_evict(key, value, reason) on eviction
+            sizeof: Function estimating a value's size in bytes
+            stale_ttl_seconds: Grace period to serve expired data while
+                refreshing in the background (0 = disabled)
+            early_refresh_beta: XFetch aggressiveness; 1.0 is a good
+                default (0 = disabled)
+            disk_tier: Optional persistent tier consulted on memory misses
+            sweep_interval: Seconds between expiry sweeps (None = only
+                expire on read)
         """
-        self.cache = {}
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Unknown cache policy: {policy!r}")
+        self.on_evict = on_evict
+        self.cache = CACHE_POLICIES[policy](max_entries, max_bytes, self._evicted)
         self.ttl = ttl_seconds
+        self.sizeof = sizeof if max_bytes is not None else None
+        self.stale_ttl = stale_ttl_seconds
+        self.early_refresh_beta = early_refresh_beta
+        self.disk_tier = disk_tier
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.background: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.disk_hits = 0
+        self.sweep_interval = sweep_interval
+        self.timers = TimerWheel(sweep_interval) if sweep_interval else None
+        self.sweeper: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.sweeps = 0
+        self.last_sweep_seconds = 0.0
+        self.total_sweep_seconds = 0.0
     
     async def get(
         self,
@@ -641,55 +3281,440 @@ class AsyncCache:
         Returns:
             Cached or freshly fetched data
         """
-        now = time.time()
-        
         # Check if in cache and not expired
-        if key in self.cache:
-            cached_data, timestamp = self.cache[key]
-            if now - timestamp < self.ttl:
-                print(f"Cache hit: {key}")
-                return cached_data
-        
-        # Cache miss or expired
-        print(f"Cache miss: {key}")
-        data = await fetcher()
+        entry = self.cache.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            age = now - entry.stored_at
+            if age < self.ttl:
+                self.hits += 1
+                if (
+                    self.early_refresh_beta
+                    and key not in self.inflight
+                    and self._should_refresh_early(entry, now)
+                ):
+                    self._refresh(key, fetcher)
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                # Serve stale data now, refresh once in the background
+                self.stale_hits += 1
+                if key not in self.inflight:
+                    self._refresh(key, fetcher)
+                return entry.value
+            # Drop expired entries instead of leaving them resident
+            self._remove(key)
         
-        # Store in cache
-        self.cache[key] = (data, now)
+        # Join a fetch that is already running for this key
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_fetch(key, fetcher)
         
+        # shield() means cancelling one waiter never cancels the shared fetch
+        return await asyncio.shield(task)
+    
+    def _should_refresh_early(self, entry: CacheEntry, now: float) -> bool:
+        """XFetch: refresh with rising probability as expiry approaches."""
+        jitter = -math.log(1.0 - random.random())  # Exponential(1) sample
+        expires_at = entry.stored_at + self.ttl
+        return now + entry.fetch_time * self.early_refresh_beta * jitter >= expires_at
+    
+    def _refresh(self, key: str, fetcher):
+        """Start a background refresh; errors keep the current value."""
+        self.refreshes += 1
+        # The disk copy is no fresher than memory, so go straight upstream
+        self._start_fetch(key, fetcher, use_disk=False)
+    
+    def _start_fetch(self, key: str, fetcher, use_disk: bool = True) -> asyncio.Task:
+        """Start the single shared fetch for a key."""
+        task = asyncio.ensure_future(self._fetch(key, fetcher, use_disk))
+        self.inflight[key] = task
+        task.add_done_callback(lambda t: self._fetch_done(key, t))
+        return task
+    
+    async def _fetch(self, key: str, fetcher, use_disk: bool = True) -> Any:
+        """Run the fetcher once and store the result."""
+        if use_disk and self.disk_tier is not None:
+            found = await self.disk_tier.get(key)
+            if found is not None:
+                data, seconds_left = found
+                self.disk_hits += 1
+                self._store(key, data, seconds_left)
+                return data
+        
+        started = time.monotonic()
+        data = await fetcher()
+        self._store(key, data, self.ttl, time.monotonic() - started)
+        if self.disk_tier is not None:
+            self._in_background(self.disk_tier.set(key, data, self.ttl))
         return data
     
-    def clear(self, key: Optional[str] = None):
-        """Clear cache."""
-        if key:
-            self.cache.pop(key, None)
-        else:
-            self.cache.clear()
-
-
-async def cache_example():
-    """Example of using async cache."""
-    print("\n--- ASYNC CACHE EXAMPLE ---")
+    def _store(self, key: str, data: Any, seconds_left: float, fetch_time: float = 0.0):
+        """Put a value in memory so that it expires in `seconds_left`."""
+        stored_at = time.monotonic() - (self.ttl - seconds_left)
+        size = self.sizeof(data) if self.sizeof else 0
+        self.cache.set(key, CacheEntry(data, stored_at, size, fetch_time))
+        if self.timers is not None:
+            self.timers.schedule(key, stored_at + self.ttl + self.stale_ttl)
+            if self.sweeper is None or self.sweeper.done():
+                self.sweeper = asyncio.create_task(self._sweep_loop())
+    
+    def _remove(self, key: str):
+        self.cache.pop(key)
+        if self.timers is not None:
+            self.timers.cancel(key)
+    
+    def _evicted(self, key: str, value: Any, reason: str):
+        """Store eviction hook: drop the key's timer, then notify."""
+        if self.timers is not None:
+            self.timers.cancel(key)
+        if self.on_evict is not None:
+            self.on_evict(key, value, reason)
+    
+    async def _sweep_loop(self):
+        """Background task: evict keys whose timers have fired."""
+        while len(self.timers):
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+    
+    def sweep(self) -> int:
+        """Evict expired keys now; returns how many were removed."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        removed = 0
+        for key in self.timers.advance(now):
+            entry = self.cache.peek(key)
+            if entry is None or now - entry.stored_at < self.ttl + self.stale_ttl:
+                continue
+            self.cache.pop(key)
+            removed += 1
+            if self.on_evict is not None:
+                self.on_evict(key, entry.value, 'expired')
+        self.expired += removed
+        self.sweeps += 1
+        self.last_sweep_seconds = time.perf_counter() - started
+        self.total_sweep_seconds += self.last_sweep_seconds
+        return removed
+    
+    def _in_background(self, coro):
+        """Run a write-behind task, keeping a reference until it finishes."""
+        task = asyncio.ensure_future(coro)
+        self.background.add(task)
+        task.add_done_callback(self._background_done)
+    
+    def _background_done(self, task: asyncio.Task):
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Cache disk write failed: {task.exception()}")
+    
+    async def warm(self, limit: int = 1000) -> int:
+        """Load the most recent live disk entries into memory."""
+        if self.disk_tier is None:
+            return 0
+        entries = await self.disk_tier.load_recent(limit)
+        # Oldest first, so the newest entries end up most recently used
+        for key, data, seconds_left in reversed(entries):
+            self._store(key, data, seconds_left)
+        return len(entries)
+    
+    async def close(self):
+        """Stop the sweeper, finish pending disk writes, close the disk tier."""
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            self.sweeper = None
+        if self.background:
+            await asyncio.gather(*self.background, return_exceptions=True)
+        if self.disk_tier is not None:
+            await self.disk_tier.close()
+    
+    def _fetch_done(self, key: str, task: asyncio.Task):
+        """Forget the in-flight task once it settles."""
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+    
+    def stats(self) -> Dict[str, int]:
+        """Cache counters; `coalesced` is upstream calls saved."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+            'disk_hits': self.disk_hits,
+            'size': len(self.cache),
+            'bytes': self.cache.bytes,
+            'evictions': self.cache.evictions,
+            'expired': self.expired,
+            'sweeps': self.sweeps,
+            'last_sweep_seconds': self.last_sweep_seconds,
+            'total_sweep_seconds': self.total_sweep_seconds,
+            'inflight': len(self.inflight)
+        }
+    
+    def clear(self, key: Optional[str] = None):
+        """Clear cache (and the disk tier, in the background)."""
+        if key:
+            self._remove(key)
+        else:
+            self.cache.clear()
+            if self.timers is not None:
+                self.timers.clear()
+        if self.disk_tier is not None:
+            self._in_background(self.disk_tier.delete(key or None))
+
+
+async def cache_example():
+    """Example of using async cache."""
+    print("\n--- ASYNC CACHE EXAMPLE ---")
+    
+    cache = AsyncCache(ttl_seconds=10)
+    
+    async def fetch_user_data():
+        """Simulate fetching user data."""
+        await asyncio.sleep(1)
+        return {'id': 1, 'name': 'John Doe'}
+    
+    # First call - fetches from API
+    user1 = await cache.get('user:1', fetch_user_data)
+    print(f"User 1: {user1}")
+    
+    # Second call - from cache
+    user2 = await cache.get('user:1', fetch_user_data)
+    print(f"User 2 (cached): {user2}")
+    
+    # Many concurrent misses share one fetch
+    await asyncio.gather(*[
+        cache.get('user:2', fetch_user_data) for _ in range(100)
+    ])
+    print(f"Cache stats: {cache.stats()}")
+    
+    return user1
+
+
+# asyncio.run(cache_example())
+
+
+"""
+HTTP CONDITIONAL REQUESTS (ETag / Last-Modified)
+
+Servers describe how long a response stays fresh (Cache-Control: max-age)
+and give it a validator (ETag or Last-Modified). Once the response is
+stale we send the validator back in If-None-Match / If-Modified-Since.
+If nothing changed the server answers "304 Not Modified" with no body,
+and we reuse our copy. On GitHub, 304 responses do not count against
+the rate limit, so this saves quota as well as bandwidth.
+"""
+
+# Response headers worth keeping alongside a cached body
+KEPT_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Link', 'Content-Type')
+
+
+class JSONResponse:
+    """Status, headers and decoded JSON body of a (possibly cached) GET."""
+    
+    __slots__ = ('status', 'reason', 'data', 'headers')
+    
+    def __init__(
+        self,
+        status: int,
+        reason: Optional[str],
+        data: Any = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        self.status = status
+        self.reason = reason
+        self.data = data
+        self.headers = headers or {}
+
+
+class CachedJSONResponse(JSONResponse):
+    """A stored JSONResponse plus its freshness deadline."""
+    
+    __slots__ = ('expires_at',)
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse 'public, max-age=60' into {'public': None, 'max-age': '60'}."""
+    directives = {}
+    for part in (header or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+class HTTPCache:
+    """
+    Stores response bodies with their validators and freshness lifetime.
+    
+    Entries live in an LRUStore, so memory is bounded by max_entries.
+    
+    One cache may serve callers with different credentials, so entries
+    are keyed by the request headers that select the response as well as
+    the URL: Authorization and Cookie always, plus any header the server
+    named in Vary. "Cache-Control: private" responses are only kept when
+    the request carried Authorization (the key then identifies the user).
+    """
+    
+    # Request headers (lower case) that always select a different response
+    KEY_HEADERS = ('authorization', 'cookie')
+    
+    def __init__(self, max_entries: int = 1000):
+        """
+        Initialize HTTP cache.
+        
+        Args:
+            max_entries: Maximum number of responses kept
+        """
+        self.max_entries = max_entries
+        self.store = LRUStore(max_entries=max_entries)
+        self.vary: Dict[str, tuple] = {}  # URL -> header names from its Vary
+        self.fresh_hits = 0     # Served without any request
+        self.revalidated = 0    # 304 Not Modified
+        self.misses = 0         # Full 200 response
+    
+    def cache_key(
+        self,
+        url: str,
+        request_headers: Optional[Dict[str, str]] = None,
+        decode: Optional[Callable[[bytes], Any]] = None
+    ) -> tuple:
+        """Key for a request: URL, decoder and the headers that select the response."""
+        sent = {name.lower(): value for name, value in (request_headers or {}).items()}
+        names = self.KEY_HEADERS + self.vary.get(url, ())
+        return (url, decode, tuple((name, sent[name]) for name in names if name in sent))
     
-    cache = AsyncCache(ttl_seconds=10)
+    def lookup(self, key: tuple) -> Optional[CacheEntry]:
+        """Entry for a cache_key(), if any."""
+        return self.store.get(key)
     
-    async def fetch_user_data():
-        """Simulate fetching user data."""
-        await asyncio.sleep(1)
-        return {'id': 1, 'name': 'John Doe'}
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() < entry.value.expires_at
     
-    # First call - fetches from API
-    user1 = await cache.get('user:1', fetch_user_data)
-    print(f"User 1: {user1}")
+    def conditional_headers(self, entry: CacheEntry) -> Dict[str, str]:
+        """Validators to send so the server can answer 304."""
+        headers = {}
+        cached = entry.value
+        if 'ETag' in cached.headers:
+            headers['If-None-Match'] = cached.headers['ETag']
+        if 'Last-Modified' in cached.headers:
+            headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        return headers
     
-    # Second call - from cache
-    user2 = await cache.get('user:1', fetch_user_data)
-    print(f"User 2 (cached): {user2}")
+    def freshness(self, headers) -> Optional[float]:
+        """Seconds the response may be reused, or None if not storable."""
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            return None
+        if 'no-cache' in directives:
+            return 0.0
+        try:
+            max_age = float(directives.get('max-age') or 0)
+            age = float(headers.get('Age') or 0)
+        except ValueError:
+            return 0.0
+        return max(0.0, max_age - age)
     
-    return user1
+    def _learn_vary(self, url: str, headers) -> tuple:
+        """Remember the headers a URL's responses vary on; returns them."""
+        vary = tuple(
+            name.strip().lower() for name in headers.get('Vary', '').split(',') if name.strip()
+        )
+        if vary and '*' not in vary:
+            known = self.vary.pop(url, ())
+            self.vary[url] = tuple(sorted((set(known) | set(vary)) - set(self.KEY_HEADERS)))
+            if len(self.vary) > self.max_entries:
+                del self.vary[next(iter(self.vary))]  # Oldest URL
+        return vary
+    
+    def store_response(
+        self,
+        url: str,
+        request_headers: Optional[Dict[str, str]],
+        decode: Optional[Callable[[bytes], Any]],
+        response: CachedJSONResponse,
+        headers
+    ) -> None:
+        """Remember a 200 response if it is cacheable."""
+        vary = self._learn_vary(url, headers)
+        key = self.cache_key(url, request_headers, decode)
+        lifetime = self.freshness(headers)
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        private = 'private' in directives and not any(name == 'authorization' for name, _ in key[2])
+        if lifetime is None or '*' in vary or private:
+            self.store.pop(key)
+            return
+        if not lifetime and 'ETag' not in headers and 'Last-Modified' not in headers:
+            self.store.pop(key)  # Nothing to reuse or revalidate with
+            return
+        response.expires_at = time.monotonic() + lifetime
+        self.store.set(key, CacheEntry(response, time.monotonic()))
+    
+    def refresh(self, entry: CacheEntry, headers) -> None:
+        """A 304 renews the freshness lifetime of the cached copy."""
+        lifetime = self.freshness(headers) or 0.0
+        entry.value.expires_at = time.monotonic() + lifetime
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'fresh_hits': self.fresh_hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'size': len(self.store)
+        }
 
 
-# asyncio.run(cache_example())
+async def conditional_get(
+    session: aiohttp.ClientSession,
+    url: str,
+    http_cache: Optional[HTTPCache] = None,
+    headers: Optional[Dict[str, str]] = None,
+    decode: Optional[Callable[[bytes], Any]] = None
+) -> JSONResponse:
+    """
+    GET a JSON URL, using validators and max-age from an HTTPCache.
+    
+    Without a cache this is a plain GET. With one, fresh entries are
+    returned without a request, stale ones are revalidated, and a 304
+    answer returns the cached body with status 200. `decode` turns the
+    body bytes into data (default: the json_loads hook).
+    """
+    entry = None
+    # Headers actually sent, including the session's defaults (credentials
+    # may be set there)
+    sent_headers = {**session.headers, **(headers or {})}
+    if http_cache is not None:
+        # The cached data depends on the decoder and on credentials sent
+        entry = http_cache.lookup(http_cache.cache_key(url, sent_headers, decode))
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if http_cache.is_fresh(entry):
+            http_cache.fresh_hits += 1
+            return entry.value
+        request_headers.update(http_cache.conditional_headers(entry))
+    
+    async with session.get(url, headers=request_headers) as response:
+        if response.status == 304 and entry is not None:
+            http_cache.revalidated += 1
+            http_cache.refresh(entry, response.headers)
+            return entry.value
+        if response.status != 200:
+            return JSONResponse(response.status, response.reason)
+        
+        kept = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        data = await read_json(response, decode)
+        if http_cache is None:
+            return JSONResponse(200, response.reason, data, kept)
+        
+        result = CachedJSONResponse(200, response.reason, data, kept)
+        http_cache.misses += 1
+        http_cache.store_response(url, sent_headers, decode, result, response.headers)
+        return result
 
 
 # ============================================================================
@@ -700,52 +3725,197 @@ async def cache_example():
 Complete example: Fetch GitHub user data and repositories
 """
 
-async def get_github_user_info(username: str) -> Dict:
-    """Fetch user info and top repositories from GitHub."""
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Fetch user info
-            user_url = f'https://api.github.com/users/{username}'
-            async with session.get(user_url) as user_response:
-                if user_response.status == 404:
-                    return {'error': f'User "{username}" not found'}
-                if user_response.status != 200:
-                    return {'error': f'Failed to fetch user: {user_response.status}'}
-                user = await user_response.json()
-            
-            # Fetch repositories
-            repos_url = f'https://api.github.com/users/{username}/repos'
-            async with session.get(repos_url) as repos_response:
-                if repos_response.status != 200:
+GITHUB_PAGE_SIZE = 100  # Maximum GitHub allows per page
+
+
+@dataclass(slots=True)
+class GitHubUser:
+    """Typed, slotted subset of a GitHub user."""
+    login: str
+    name: Optional[str] = None
+    bio: Optional[str] = None
+    public_repos: int = 0
+    followers: int = 0
+    following: int = 0
+
+
+@dataclass(slots=True)
+class GitHubRepo:
+    """Typed, slotted subset of a GitHub repository."""
+    name: str
+    full_name: str = ''
+    html_url: str = ''
+    description: Optional[str] = None
+    language: Optional[str] = None
+    stargazers_count: int = 0
+    forks_count: int = 0
+
+
+GITHUB_USER_FIELDS = tuple(GitHubUser.__dataclass_fields__)
+GITHUB_REPO_FIELDS = tuple(GitHubRepo.__dataclass_fields__)
+
+_github_user_decoder = msgspec.json.Decoder(GitHubUser) if msgspec is not None else None
+_github_repos_decoder = msgspec.json.Decoder(List[GitHubRepo]) if msgspec is not None else None
+
+
+def decode_github_user(body: bytes) -> GitHubUser:
+    """Decode response bytes into a GitHubUser (unknown fields dropped)."""
+    if msgspec_active():
+        return _github_user_decoder.decode(body)
+    data = json_loads(body)
+    return GitHubUser(**{k: data[k] for k in GITHUB_USER_FIELDS if k in data})
+
+
+def decode_github_repos(body: bytes) -> List[GitHubRepo]:
+    """Decode a page of repositories into GitHubRepo objects."""
+    if msgspec_active():
+        return _github_repos_decoder.decode(body)
+    return [
+        GitHubRepo(**{k: repo[k] for k in GITHUB_REPO_FIELDS if k in repo})
+        for repo in json_loads(body)
+    ]
+
+
+class TopK:
+    """
+    Keep the k largest items seen so far in a min-heap.
+    
+    Memory is O(k) no matter how many items are pushed, and each push
+    costs O(log k) - unlike sorting the whole list to take the first k.
+    """
+    
+    __slots__ = ('k', 'key', 'heap', 'counter')
+    
+    def __init__(self, k: int, key: Callable[[Any], Any]):
+        self.k = k
+        self.key = key
+        self.heap: List[tuple] = []
+        self.counter = 0  # Tie-breaker so items themselves are never compared
+    
+    def push(self, item: Any):
+        self.counter += 1
+        entry = (self.key(item), self.counter, item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+    
+    def extend(self, items: Iterable):
+        for item in items:
+            self.push(item)
+    
+    def items(self) -> List[Any]:
+        """The kept items, largest first."""
+        return [item for _, _, item in sorted(self.heap, reverse=True)]
+
+
+def parse_last_page(link_header: Optional[str]) -> int:
+    """Read the page count from a GitHub Link header (1 if absent)."""
+    for part in (link_header or '').split(','):
+        if 'rel="last"' in part:
+            match = re.search(r'[?&]page=(\d+)', part)
+            if match:
+                return int(match.group(1))
+    return 1
+
+
+async def get_github_user_info(
+    username: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    http_cache: Optional[HTTPCache] = None,
+    top_n: int = 5,
+    page_concurrency: int = 8,
+    typed: bool = False
+) -> Dict:
+    """
+    Fetch user info and top repositories from GitHub.
+    
+    The user and the first page of repositories are fetched together.
+    The first page's Link header says how many pages there are; the rest
+    are fetched concurrently and folded into a TopK heap one page at a
+    time, so only `top_n` repositories are ever kept.
+    
+    Pass an HTTPCache to revalidate with ETags: unchanged data comes back
+    as 304, which GitHub does not count against the rate limit.
+    
+    With typed=True, 'user' is a GitHubUser and 'top_repositories' is a
+    list of GitHubRepo, decoded straight from the response bytes.
+    """
+    session = session or get_session()
+    breaker = circuit_breakers.get('api.github.com')
+    repos_url = f'https://api.github.com/users/{username}/repos?per_page={GITHUB_PAGE_SIZE}'
+    if typed:
+        top_repositories = TopK(top_n, key=lambda r: r.stargazers_count)
+    else:
+        top_repositories = TopK(top_n, key=lambda r: r['stargazers_count'])
+    
+    async def fetch_page(page: int) -> JSONResponse:
+        breaker.allow_request()
+        response = await conditional_get(
+            session, f'{repos_url}&page={page}', http_cache,
+            decode=decode_github_repos if typed else None
+        )
+        breaker.record_status(response.status)
+        return response
+    
+    async def fetch_user() -> JSONResponse:
+        breaker.allow_request()
+        response = await conditional_get(
+            session, f'https://api.github.com/users/{username}', http_cache,
+            decode=decode_github_user if typed else None
+        )
+        breaker.record_status(response.status)
+        return response
+    
+    try:
+        # Fetch user info and the first page of repositories together
+        user_response, first_page = await asyncio.gather(fetch_user(), fetch_page(1))
+        if user_response.status == 404:
+            return {'error': f'User "{username}" not found'}
+        if user_response.status != 200:
+            return {'error': f'Failed to fetch user: {user_response.status}'}
+        if first_page.status != 200:
+            return {'error': 'Failed to fetch repositories'}
+        user = user_response.data
+        top_repositories.extend(first_page.data)
+        
+        # Fetch the remaining pages concurrently, keeping only the top N
+        last_page = parse_last_page(first_page.headers.get('Link'))
+        pages = bounded_map(fetch_page, range(2, last_page + 1), concurrency=page_concurrency)
+        async with aclosing(pages):
+            async for page in pages:
+                if page.status != 200:
                     return {'error': 'Failed to fetch repositories'}
-                repos = await repos_response.json()
-            
-            # Process and return
-            return {
-                'user': {
-                    'name': user['name'],
-                    'login': user['login'],
-                    'bio': user['bio'],
-                    'public_repos': user['public_repos'],
-                    'followers': user['followers'],
-                    'following': user['following']
-                },
-                'top_repositories': sorted(
-                    repos,
-                    key=lambda r: r['stargazers_count'],
-                    reverse=True
-                )[:5]
-            }
-            
-        except aiohttp.ClientError as e:
-            return {'error': f'Network error: {str(e)}'}
+                top_repositories.extend(page.data)
+        
+        # Process and return
+        if typed:
+            return {'user': user, 'top_repositories': top_repositories.items()}
+        return {
+            'user': {
+                'name': user['name'],
+                'login': user['login'],
+                'bio': user['bio'],
+                'public_repos': user['public_repos'],
+                'followers': user['followers'],
+                'following': user['following']
+            },
+            'top_repositories': top_repositories.items()
+        }
+    
+    except CircuitOpenError as e:
+        return {'error': str(e)}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        breaker.record_failure()
+        return {'error': f'Network error: {str(e)}'}
 
 
 async def github_example():
     """Example of GitHub API integration."""
     print("\n--- GITHUB API EXAMPLE ---")
     
-    info = await get_github_user_info('torvalds')
+    async with http_sessions as session:
+        info = await get_github_user_info('torvalds', session)
     
     if 'error' in info:
         print(f"Error: {info['error']}")
@@ -824,6 +3994,857 @@ async def wait_example():
         task.cancel()
 
 
+"""
+HEDGED REQUESTS
+
+The slowest 1% of requests usually wait on one slow server or one lost
+packet - sending the same request again is often faster than waiting.
+A hedged request fires a duplicate only if the first one is slower than
+the host's usual p95, takes whichever answers first and cancels the
+other. Capping hedges at a few percent of traffic keeps the extra load
+small. Only hedge idempotent requests such as GETs.
+"""
+
+class HedgingPolicy:
+    """Per-host latency history and hedge budget for hedged_fetch()."""
+    
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        max_hedge_ratio: float = 0.05,
+        window: int = 256,
+        min_samples: int = 20,
+        default_delay: float = 0.5
+    ):
+        """
+        Initialize hedging policy.
+        
+        Args:
+            quantile: Latency quantile after which to hedge
+            max_hedge_ratio: Maximum hedges as a fraction of requests
+            window: Recent latencies kept per host
+            min_samples: Samples needed before trusting the quantile
+            default_delay: Hedge delay used until then (seconds)
+        """
+        self.quantile = quantile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.samples: Dict[str, deque] = {}
+        self.recorded: Dict[str, int] = {}  # Samples ever recorded per host
+        self.thresholds: Dict[str, float] = {}
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+    
+    def record(self, host: str, seconds: float):
+        samples = self.samples.get(host)
+        if samples is None:
+            samples = self.samples[host] = deque(maxlen=self.window)
+        samples.append(seconds)
+        recorded = self.recorded[host] = self.recorded.get(host, 0) + 1
+        # Re-sorting 256 samples is cheap, but only do it every 16 requests
+        # (count them separately: len(samples) stops growing at the window)
+        if len(samples) >= self.min_samples and recorded % 16 == 0:
+            ordered = sorted(samples)
+            self.thresholds[host] = ordered[int(self.quantile * (len(ordered) - 1))]
+    
+    def threshold(self, host: str) -> float:
+        """How long to wait for the first request before hedging."""
+        return self.thresholds.get(host, self.default_delay)
+    
+    def try_hedge(self) -> bool:
+        """Spend one hedge if we are under the traffic cap."""
+        if self.hedges < self.max_hedge_ratio * self.requests:
+            self.hedges += 1
+            return True
+        return False
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'thresholds': dict(self.thresholds)
+        }
+
+
+hedging = HedgingPolicy()
+
+
+def fetch_succeeded(result: Any) -> bool:
+    """Success test for fetch_url/get_weather style result dicts."""
+    if isinstance(result, dict):
+        return result.get('status') != 'error' and 'error' not in result
+    return result is not None
+
+
+async def hedged_fetch(
+    session: aiohttp.ClientSession,
+    url: str,
+    request: Optional[Callable[[aiohttp.ClientSession, str], Awaitable[Any]]] = None,
+    policy: Optional[HedgingPolicy] = None,
+    succeeded: Callable[[Any], bool] = fetch_succeeded
+) -> Any:
+    """
+    Fetch with a backup request if the first one is unusually slow.
+    
+    Args:
+        session: aiohttp ClientSession
+        url: URL to fetch (must be safe to request twice)
+        request: Coroutine function request(session, url) (default:
+            fetch_url, without the adaptive limit - under it the hedge
+            would wait for the same host slot as the slow primary)
+        policy: HedgingPolicy (default: module-wide)
+        succeeded: Decides whether a result counts as a success
+    
+    Returns:
+        The first successful result, or the last result if both failed
+    """
+    request = request or fetch_url
+    policy = policy or hedging
+    host = host_key(url)
+    policy.requests += 1
+    
+    started = time.monotonic()
+    primary = asyncio.create_task(request(session, url))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=policy.threshold(host))
+        if not done:
+            if not policy.try_hedge():
+                await asyncio.wait(tasks)
+            else:
+                tasks.add(asyncio.create_task(request(session, url)))
+        
+        # First success wins; if one fails, keep waiting for the other
+        last = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                last = task
+                if task.exception() is None and succeeded(task.result()):
+                    policy.record(host, time.monotonic() - started)
+                    if task is not primary:
+                        policy.hedge_wins += 1
+                    return task.result()
+        return last.result()
+    finally:
+        # Cancel the loser (or both, if we were cancelled)
+        for task in tasks:
+            task.cancel()
+
+
+"""
+BATCHING (THE "DATALOADER" PATTERN)
+
+When many coroutines each ask for one item, collect all the keys
+requested in the same event-loop iteration (or a short window), drop
+duplicates, and make ONE batch call for all of them. Each caller still
+awaits just its own key.
+"""
+
+class BatchLoader:
+    """Coalesces load(key) calls into batched, de-duplicated requests."""
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[Union[Dict, List]]],
+        max_batch_size: int = 100,
+        batch_window: float = 0.0
+    ):
+        """
+        Initialize batch loader.
+        
+        Args:
+            batch_fn: Async function taking a list of unique keys and
+                returning {key: value} or a list of values in key order.
+                A value that is an Exception is raised for that key only.
+            max_batch_size: Dispatch as soon as this many keys are waiting
+            batch_window: Seconds to collect keys (0 = one loop iteration)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.pending: Dict[Any, asyncio.Future] = {}
+        self.handle: Optional[asyncio.Handle] = None
+        self.running: set = set()
+        self.loads = 0
+        self.deduplicated = 0
+        self.batches = 0
+    
+    async def load(self, key: Any) -> Any:
+        """Load one key as part of the next batch."""
+        self.loads += 1
+        future = self.pending.get(key)
+        if future is not None:
+            self.deduplicated += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.pending[key] = future
+            if len(self.pending) >= self.max_batch_size:
+                self._dispatch()
+            elif self.handle is None:
+                if self.batch_window > 0:
+                    self.handle = loop.call_later(self.batch_window, self._dispatch)
+                else:
+                    # Runs after every task already scheduled this iteration
+                    self.handle = loop.call_soon(self._dispatch)
+        # shield(): one cancelled caller must not fail the other waiters
+        return await asyncio.shield(future)
+    
+    async def load_many(self, keys: Iterable) -> List[Any]:
+        """Load several keys (duplicates are fetched once)."""
+        return await asyncio.gather(*[self.load(key) for key in keys])
+    
+    def _dispatch(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+    
+    async def _run_batch(self, batch: Dict[Any, asyncio.Future]):
+        self.batches += 1
+        keys = list(batch)
+        try:
+            results = await self.batch_fn(keys)
+            if not isinstance(results, dict):
+                results = dict(zip(keys, results))
+        except Exception as e:
+            results = {key: e for key in keys}
+        except BaseException:
+            # Batch cancelled (e.g. at shutdown): don't leave callers waiting
+            for future in batch.values():
+                future.cancel()
+            raise
+        
+        for key, future in batch.items():
+            if future.done():
+                continue
+            value = results.get(key, KeyError(key))
+            if isinstance(value, Exception):
+                future.set_exception(value)
+                future.exception()  # Don't log it if every waiter was cancelled
+            else:
+                future.set_result(value)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'loads': self.loads,
+            'deduplicated': self.deduplicated,
+            'batches': self.batches
+        }
+
+
+def weather_loader(
+    session: aiohttp.ClientSession,
+    concurrency: int = 10,
+    batch_window: float = 0.01
+) -> BatchLoader:
+    """
+    BatchLoader for get_weather().
+    
+    The free OpenWeather API has no multi-city endpoint by name, so a
+    batch fetches its unique cities with bounded concurrency - callers
+    asking for the same city in the same window share one request.
+    """
+    async def fetch_batch(cities: List[str]) -> List[Dict]:
+        return [
+            weather async for weather in bounded_map(
+                lambda city: get_weather(session, city),
+                cities,
+                concurrency=concurrency,
+                ordered=True
+            )
+        ]
+    
+    return BatchLoader(fetch_batch, batch_window=batch_window)
+
+
+async def batch_loader_example():
+    """100 lookups for 5 distinct keys become one batch of 5."""
+    print("\n--- BATCH LOADER EXAMPLE ---")
+    
+    async def fetch_items(keys: List[int]) -> Dict[int, Dict]:
+        print(f"Batch call for keys {keys}")
+        results = await asyncio.gather(*[fetch_data(key, delay=0.1) for key in keys])
+        return dict(zip(keys, results))
+    
+    loader = BatchLoader(fetch_items)
+    items = await asyncio.gather(*[loader.load(i % 5) for i in range(100)])
+    
+    print(f"Loaded {len(items)} items: {loader.stats()}")
+    return items
+
+
+"""
+MULTI-PROCESS FAN-OUT
+
+One event loop runs on one CPU core. Once decoding and processing the
+responses is the bottleneck (not waiting on the network), more
+coroutines don't help - more processes do. FanOutEngine starts N worker
+processes, each with its own event loop and ClientSession, and feeds
+them chunks of the input from one queue (so a slow worker simply takes
+fewer chunks). Results come back through a second queue and the parent
+reads them as a single async iterator.
+
+The rate limit is for all workers together: they share one
+SharedRateLimiter, so the upstream quota holds however the work is
+spread across them.
+"""
+
+def _picklable_results(results: List[Any]) -> bytes:
+    """Pickle a batch, replacing values that can't cross a process boundary."""
+    try:
+        return pickle.dumps(results)
+    except Exception:
+        safe = []
+        for result in results:
+            try:
+                pickle.dumps(result)
+                safe.append(result)
+            except Exception:
+                safe.append(RuntimeError(f"Unpicklable result: {result!r}"))
+        return pickle.dumps(safe)
+
+
+def _fan_out_worker(
+    worker_id: int,
+    fn: Callable[[aiohttp.ClientSession, Any], Awaitable[Any]],
+    tasks,
+    results,
+    options: Dict[str, Any]
+):
+    """Entry point of each worker process: its own loop, session and limiter."""
+    async def main() -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        limiter = options['limiter']
+        stats = {'worker': worker_id, 'pid': os.getpid(), 'items': 0, 'errors': 0}
+        
+        async def next_items():
+            while True:
+                chunk = await loop.run_in_executor(None, tasks.get)
+                if chunk is None:  # No more input
+                    return
+                for item in chunk:
+                    yield item
+        
+        async def call(item: Any) -> Any:
+            if limiter is not None:
+                await limiter.wait_if_needed()
+            try:
+                return await fn(session, item)
+            except Exception as e:
+                stats['errors'] += 1
+                return e
+        
+        async with SessionManager(
+            limit=options['concurrency'],
+            limit_per_host=options['concurrency']
+        ) as session:
+            # Send results in batches: one queue message per result is slow
+            batch = []
+            flushed = time.monotonic()
+            async for result in bounded_map(call, next_items(), concurrency=options['concurrency']):
+                stats['items'] += 1
+                batch.append(result)
+                if len(batch) >= options['chunk_size'] or time.monotonic() - flushed > 0.05:
+                    results.put(('results', _picklable_results(batch)))
+                    batch = []
+                    flushed = time.monotonic()
+            if batch:
+                results.put(('results', _picklable_results(batch)))
+        return stats
+    
+    try:
+        stats, loop_stats = run_with_stats(main(), use_uvloop=options['use_uvloop'], lag_interval=None)
+        stats['loop'] = loop_stats.as_dict()
+        results.put(('done', stats))
+    except BaseException:
+        results.put(('error', (worker_id, traceback.format_exc())))
+
+
+class FanOutEngine:
+    """
+    Runs fn(session, item) for a stream of items across worker processes.
+    
+    fn must be a module-level coroutine function (it is pickled and sent
+    to the workers), for example fetch_url or get_weather.
+    """
+    
+    def __init__(
+        self,
+        fn: Callable[[aiohttp.ClientSession, Any], Awaitable[Any]],
+        processes: Optional[int] = None,
+        concurrency: int = 50,
+        max_requests: Optional[int] = None,
+        period_seconds: float = 60,
+        chunk_size: int = 50,
+        use_uvloop: Optional[bool] = None
+    ):
+        """
+        Initialize fan-out engine.
+        
+        Args:
+            fn: Coroutine function fn(session, item) run in the workers
+            processes: Worker processes (default: one per CPU core)
+            concurrency: Calls in flight per worker
+            max_requests: Calls allowed per period for all workers together
+                (None = no rate limit)
+            period_seconds: Time period for max_requests
+            chunk_size: Items per queue message, in both directions
+            use_uvloop: Event loop for the workers (None = uvloop if installed)
+        """
+        self.fn = fn
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.max_requests = max_requests
+        self.period = period_seconds
+        self.chunk_size = chunk_size
+        self.use_uvloop = use_uvloop
+        self.worker_stats: List[Dict[str, Any]] = []
+    
+    async def _feed(self, items: Union[Iterable, AsyncIterable], tasks):
+        """Send items to the workers in chunks, then one stop marker each."""
+        loop = asyncio.get_running_loop()
+        
+        async def put(message):
+            # The queue is bounded, so a huge input is never all in memory
+            while True:
+                try:
+                    return await loop.run_in_executor(None, tasks.put, message, True, 0.2)
+                except queue.Full:
+                    continue
+        
+        chunk = []
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    await put(chunk)
+                    chunk = []
+        else:
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    await put(chunk)
+                    chunk = []
+        if chunk:
+            await put(chunk)
+        for _ in range(self.processes):
+            await put(None)
+    
+    def _check_workers(self, workers: List, feeder: asyncio.Task):
+        """Raise if the feeder failed or a worker died without reporting."""
+        if feeder.done() and not feeder.cancelled() and feeder.exception() is not None:
+            raise feeder.exception()
+        finished = {stats['worker'] for stats in self.worker_stats}
+        for worker_id, worker in enumerate(workers):
+            if worker.exitcode is not None and worker_id not in finished:
+                raise RuntimeError(f"Fan-out worker {worker_id} exited with code {worker.exitcode}")
+    
+    async def map(
+        self,
+        items: Union[Iterable, AsyncIterable],
+        return_exceptions: bool = False
+    ) -> AsyncIterator[Any]:
+        """
+        Yield fn(session, item) for every item, in completion order.
+        
+        Args:
+            items: Items (a regular or async iterable, consumed lazily)
+            return_exceptions: Yield exceptions instead of raising them
+        """
+        loop = asyncio.get_running_loop()
+        # 'spawn' starts clean interpreters: forking a process that has a
+        # running event loop (and its threads) is not safe
+        context = multiprocessing.get_context('spawn')
+        tasks = context.Queue(maxsize=self.processes * 2)
+        results = context.Queue()
+        limiter = None
+        if self.max_requests is not None:
+            limiter = SharedRateLimiter(self.max_requests, self.period)
+        options = {
+            'concurrency': self.concurrency,
+            'chunk_size': self.chunk_size,
+            'limiter': limiter,
+            'use_uvloop': self.use_uvloop
+        }
+        workers = [
+            context.Process(
+                target=_fan_out_worker,
+                args=(worker_id, self.fn, tasks, results, options),
+                daemon=True
+            )
+            for worker_id in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        
+        self.worker_stats = []
+        feeder = asyncio.create_task(self._feed(items, tasks))
+        try:
+            while len(self.worker_stats) < self.processes:
+                try:
+                    kind, payload = await loop.run_in_executor(None, results.get, True, 0.2)
+                except queue.Empty:
+                    self._check_workers(workers, feeder)
+                    continue
+                
+                if kind == 'results':
+                    for result in pickle.loads(payload):
+                        if isinstance(result, Exception) and not return_exceptions:
+                            raise result
+                        yield result
+                elif kind == 'done':
+                    self.worker_stats.append(payload)
+                else:
+                    worker_id, trace = payload
+                    raise RuntimeError(f"Fan-out worker {worker_id} failed:\n{trace}")
+            await feeder
+        finally:
+            feeder.cancel()
+            tasks.cancel_join_thread()
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            for worker in workers:
+                await loop.run_in_executor(None, worker.join)
+            if limiter is not None:
+                limiter.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'processes': self.processes,
+            'items': sum(stats['items'] for stats in self.worker_stats),
+            'errors': sum(stats['errors'] for stats in self.worker_stats),
+            'per_worker': [stats['items'] for stats in self.worker_stats]
+        }
+
+
+async def fan_out_example():
+    """Fetch 200 posts with 4 worker processes, 20 requests/second overall."""
+    print("\n--- MULTI-PROCESS FAN-OUT EXAMPLE ---")
+    start = time.time()
+    
+    urls = [f'https://jsonplaceholder.typicode.com/posts/{i % 100 + 1}' for i in range(200)]
+    engine = FanOutEngine(fetch_url, processes=4, concurrency=10, max_requests=20, period_seconds=1)
+    
+    successful = 0
+    results = engine.map(urls)
+    async with aclosing(results):
+        async for result in results:
+            if result['status'] == 'success':
+                successful += 1
+    
+    elapsed = time.time() - start
+    print(f"Fetched {successful}/{len(urls)} URLs in {elapsed:.1f}s: {engine.stats()}")
+    return successful
+
+
+"""
+WORKER POOL
+
+create_task_example() starts a few ad-hoc workers. A long-running crawl
+needs more than that:
+- A bounded queue: submit() waits when the queue is full, so producers
+  slow down to the workers' pace instead of piling up tasks
+- A fixed number of workers in a TaskGroup, whatever the input size
+- A timeout per item, so one hung request cannot stall a worker
+- A dead-letter list for items that failed, to inspect or retry later
+- Graceful drain: on SIGTERM stop accepting work, finish what is queued,
+  then exit (a second signal stops immediately)
+- Live metrics: queue depth, busy workers and throughput
+"""
+
+@dataclass(slots=True)
+class DeadLetter:
+    """An item the pool gave up on, and why."""
+    item: Any
+    error: BaseException
+    elapsed: float
+
+
+class WorkerPool:
+    """Fixed set of workers fed by a bounded queue."""
+    
+    _STOP = object()  # Queue marker: the worker that takes it exits
+    
+    def __init__(
+        self,
+        fn: Callable[[Any], Awaitable[Any]],
+        workers: int = 10,
+        queue_size: int = 100,
+        task_timeout: Optional[float] = 30.0,
+        on_dead_letter: Optional[Callable[[DeadLetter], Any]] = None,
+        max_dead_letters: int = 1000,
+        report_interval: Optional[float] = None,
+        throughput_window: int = 10
+    ):
+        """
+        Initialize worker pool.
+        
+        Args:
+            fn: Async function called once per item
+            workers: Number of worker tasks
+            queue_size: Items waiting at most (submit() blocks beyond this)
+            task_timeout: Seconds allowed per item (None = no limit)
+            on_dead_letter: Called (or awaited) with each DeadLetter
+            max_dead_letters: Most recent dead letters kept in memory
+            report_interval: Print stats every N seconds (None = never)
+            throughput_window: Seconds of history used for throughput
+        """
+        self.fn = fn
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task_timeout = task_timeout
+        self.on_dead_letter = on_dead_letter
+        self.dead_letters: deque = deque(maxlen=max_dead_letters)
+        self.report_interval = report_interval
+        self.throughput_window = throughput_window
+        self.completions: deque = deque(maxlen=throughput_window + 1)  # [second, count]
+        self.closing = False
+        self.stopped = False
+        self.task: Optional[asyncio.Task] = None
+        self.worker_tasks: List[asyncio.Task] = []
+        self.stopper: Optional[asyncio.Task] = None
+        self.started = 0.0
+        self.submitted = 0
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.dropped = 0
+    
+    async def __aenter__(self) -> 'WorkerPool':
+        self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.drain()
+        else:
+            self.stop()
+            await asyncio.gather(self.task, return_exceptions=True)
+    
+    def start(self) -> asyncio.Task:
+        """Run the pool in the background (see run())."""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.task
+    
+    async def submit(self, item: Any):
+        """Queue an item, waiting while the queue is full."""
+        if self.closing:
+            raise RuntimeError("WorkerPool is draining and accepts no new items")
+        await self.queue.put(item)
+        self.submitted += 1
+        if self.stopped:
+            # stop() ran while we waited for room: the item will never run
+            self._discard_queued()
+
+    def close(self):
+        """Stop accepting items; workers exit once the queue is empty."""
+        if self.closing:
+            return
+        self.closing = True
+        # The stop markers queue up behind every item already waiting
+        self.stopper = asyncio.ensure_future(self._put_stop_markers())
+    
+    async def drain(self):
+        """close(), then wait until every queued item has been processed."""
+        self.close()
+        if self.task is not None:
+            await self.task
+    
+    def stop(self):
+        """
+        Stop now: cancel the workers and drop queued items.
+        
+        Items in flight and in the queue are counted as dropped, so
+        submitted always equals completed + failed + dropped once the
+        pool has finished.
+        """
+        self.closing = self.stopped = True
+        for task in self.worker_tasks:
+            task.cancel()
+        if self.stopper is not None:
+            self.stopper.cancel()
+        # Empty the queue so producers blocked in submit() wake up
+        self._discard_queued()
+    
+    def _discard_queued(self):
+        while not self.queue.empty():
+            if self.queue.get_nowait() is not self._STOP:
+                self.dropped += 1
+            self.queue.task_done()
+    
+    async def _put_stop_markers(self):
+        for _ in range(self.workers):
+            await self.queue.put(self._STOP)
+    
+    def _on_signal(self, signum: int):
+        if not self.closing:
+            print(f"{signal.Signals(signum).name}: draining {self.queue.qsize()} queued items "
+                  f"(send again to stop now)")
+            self.close()
+        else:
+            print(f"{signal.Signals(signum).name}: stopping now")
+            self.stop()
+    
+    def _install_signal_handlers(self, loop: asyncio.AbstractEventLoop) -> List[int]:
+        installed = []
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, self._on_signal, signum)
+            except (NotImplementedError, RuntimeError, ValueError):
+                continue  # Windows, or not the main thread
+            installed.append(signum)
+        return installed
+    
+    async def run(self, handle_signals: bool = True):
+        """
+        Run the workers until the pool is drained or stopped.
+        
+        Args:
+            handle_signals: Drain on SIGTERM/SIGINT (main thread only)
+        """
+        loop = asyncio.get_running_loop()
+        signals = self._install_signal_handlers(loop) if handle_signals else []
+        reporter = None
+        if self.report_interval:
+            reporter = asyncio.create_task(self._report())
+        self.started = time.monotonic()
+        try:
+            async with asyncio.TaskGroup() as group:
+                self.worker_tasks = [
+                    group.create_task(self._worker()) for _ in range(self.workers)
+                ]
+                if self.stopped:
+                    self.stop()  # stop() came before the workers existed
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+        if self.report_interval:
+            print(f"Worker pool finished: {self.stats()}")
+    
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                await self._process(item)
+            finally:
+                self.queue.task_done()
+    
+    async def _process(self, item: Any):
+        self.busy += 1
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.task_timeout):
+                await self.fn(item)
+        except asyncio.CancelledError:
+            self.dropped += 1  # stop() (or shutdown) cancelled it mid-flight
+            raise
+        except Exception as e:
+            if isinstance(e, TimeoutError):
+                self.timed_out += 1
+            await self._dead_letter(DeadLetter(item, e, time.monotonic() - started))
+        else:
+            self.completed += 1
+            self._record_completion()
+        finally:
+            self.busy -= 1
+    
+    async def _dead_letter(self, dead: DeadLetter):
+        self.failed += 1
+        self.dead_letters.append(dead)
+        if self.on_dead_letter is None:
+            return
+        try:
+            result = self.on_dead_letter(dead)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"Dead-letter handler failed: {e!r}")
+    
+    def _record_completion(self):
+        # One counter per second: memory does not grow with the rate
+        second = int(time.monotonic())
+        if self.completions and self.completions[-1][0] == second:
+            self.completions[-1][1] += 1
+        else:
+            self.completions.append([second, 1])
+    
+    def throughput(self) -> float:
+        """Items completed per second over the last throughput_window seconds."""
+        now = time.monotonic()
+        window = min(self.throughput_window, now - self.started)
+        if window <= 0:
+            return 0.0
+        since = now - window
+        recent = sum(count for second, count in self.completions if second + 1 > since)
+        return recent / max(window, 1.0)
+    
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            stats = self.stats()
+            print(
+                f"queue {stats['queued']}/{stats['queue_size']}  "
+                f"busy {stats['busy']}/{self.workers}  "
+                f"done {stats['completed']}  failed {stats['failed']}  "
+                f"{stats['throughput']:.1f}/s"
+            )
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'busy': self.busy,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'dropped': self.dropped,
+            'throughput': round(self.throughput(), 2),
+            'closing': self.closing
+        }
+
+
+async def worker_pool_example():
+    """Crawl 200 posts with 10 workers and a queue of 20 (Ctrl+C drains)."""
+    print("\n--- WORKER POOL EXAMPLE ---")
+    
+    async with http_sessions as session:
+        async def crawl(url: str):
+            result = await fetch_url(session, url)
+            if result['status'] != 'success':
+                raise RuntimeError(result.get('error') or result.get('code'))
+        
+        pool = WorkerPool(crawl, workers=10, queue_size=20, task_timeout=10, report_interval=1.0)
+        async with pool:
+            for i in range(200):
+                if pool.closing:
+                    break  # SIGTERM / Ctrl+C: stop producing, let the pool drain
+                # Waits whenever 20 URLs are already queued
+                await pool.submit(f'https://jsonplaceholder.typicode.com/posts/{i % 100 + 1}')
+    
+    for dead in list(pool.dead_letters)[:5]:
+        print(f"Dead letter: {dead.item} ({dead.error!r})")
+    return pool.stats()
+
+
 # ============================================================================
 # SECTION 14: COMPARING PYTHON AND JAVASCRIPT ASYNC
 # ============================================================================
@@ -875,45 +4896,66 @@ BEST PRACTICES FOR ASYNC PYTHON:
 1. USE asyncio.gather() FOR PARALLEL EXECUTION
    - Much faster than sequential awaits
    - Start all tasks, then await together
+   - For large inputs use bounded_map() to cap in-flight work
 
 2. USE aiohttp FOR HTTP REQUESTS
    - More efficient than requests library
    - Reuse session for multiple requests
    - Set timeouts to prevent hanging
+   - Stream large JSON arrays (fetch_json_stream) instead of buffering them
+   - Trace DNS / connect / TTFB per host into histograms, not print()
 
 3. ALWAYS HANDLE ERRORS
    - Use try/except with await
    - Set return_exceptions=True in gather for fault tolerance
    - Implement retry logic for network requests
+   - Add jitter, honour Retry-After and cap retries with a budget
+   - Use a circuit breaker per host to fail fast while it is down
+   - Let concurrency per host adapt (AIMD, adaptive=True) instead of guessing a number
 
 4. USE ASYNCIO.WAIT_FOR FOR TIMEOUTS
    - Prevent requests from hanging
    - Set appropriate timeout values
 
-5. IMPLEMENT RATE LIMITING
+5. SHARE ONE SESSION PER PROCESS
+   - A new ClientSession per call means a new DNS lookup + TLS handshake
+   - Tune the connector: per-host limits, DNS cache, keep-alive
+   - Pass per-request timeouts instead of creating new sessions
+
+6. IMPLEMENT RATE LIMITING
    - Don't overwhelm APIs
-   - Use asyncio.Lock for thread-safe operations
-   - Track request timestamps
+   - Reserve slots with a token bucket (GCRA) - O(1) per request
+   - Never await asyncio.sleep() while holding a lock
+   - Several processes must share one limiter (SharedRateLimiter)
+   - Use time.monotonic() for intervals, not time.time()
+   - Give interactive requests priority over batch backfills
 
-6. CACHE RESPONSES
+7. CACHE RESPONSES
    - Reduce API calls
    - Implement TTL (time to live)
+   - Bound memory with max_entries / max_bytes (LRU or TinyLFU)
+   - Coalesce concurrent misses so one fetch serves every waiter
+   - Revalidate with ETag / Last-Modified and honour Cache-Control
    - Clear cache when data changes
 
-7. USE CONTEXT MANAGERS
+8. USE CONTEXT MANAGERS
    - async with session.get() as response:
    - Ensures resources are properly cleaned up
 
-8. NEVER SLEEP BLOCK
+9. NEVER SLEEP BLOCK
    - Use await asyncio.sleep() not time.sleep()
    - time.sleep() blocks the entire event loop
+   - Run with debug=True to find callbacks that block the loop
+   - uvloop is a drop-in faster loop - measure it with compare_loops()
+   - When one core is saturated, fan out across processes (FanOutEngine)
+   - For long crawls use a WorkerPool: bounded queue, fixed workers, drain on SIGTERM
 
-9. DOCUMENT ASYNC BEHAVIOR
-   - Specify which functions are coroutines
-   - Document expected concurrency patterns
-   - Note any blocking operations
+10. DOCUMENT ASYNC BEHAVIOR
+    - Specify which functions are coroutines
+    - Document expected concurrency patterns
+    - Note any blocking operations
 
-10. TEST ASYNC CODE
+11. TEST ASYNC CODE
     - Use pytest-asyncio plugin
     - Test both success and error cases
     - Verify proper cleanup and resource management
@@ -940,16 +4982,57 @@ data = await cache.get(key, fetcher)
 
 if __name__ == '__main__':
     # Run examples (uncomment to test)
-    # asyncio.run(run_hello_example())
-    # asyncio.run(sequential_example())
-    # asyncio.run(parallel_example())
-    # asyncio.run(gather_example())
-    # asyncio.run(error_handling_example())
-    # asyncio.run(fetch_multiple_urls())
-    # asyncio.run(get_weather_for_cities(['Vienna', 'Berlin', 'Paris']))
-    # asyncio.run(github_example())
-    # asyncio.run(create_task_example())
-    # asyncio.run(wait_example())
-    
-    print("Week 9 Python Async Examples")
-    print("Uncomment examples in __main__ to test")
\ No newline at end of file
+    # run(run_hello_example())
+    # run(sequential_example())
+    # run(parallel_example())
+    # run(gather_example())
+    # run(bounded_map_example())
+    # run(error_handling_example())
+    # run(stream_example())
+    # run(fetch_multiple_urls())
+    # run(tracing_example())
+    # run(get_weather_for_cities(['Vienna', 'Berlin', 'Paris']))
+    # run(github_example())
+    # run(create_task_example())
+    # run(wait_example())
+    # run(batch_loader_example())
+    # run(fan_out_example())
+    # run(worker_pool_example())
+    
+    parser = argparse.ArgumentParser(description="Week 9 Python Async Examples")
+    parser.add_argument('example', nargs='?', help="Example coroutine to run, e.g. gather_example")
+    parser.add_argument('--ab', action='store_true', help="Compare asyncio and uvloop (default workload: loop_workload)")
+    parser.add_argument('--rounds', type=int, default=5, help="Rounds per loop in --ab mode")
+    parser.add_argument('--no-uvloop', action='store_true', help="Use the default asyncio loop")
+    parser.add_argument('--workers', type=int, help="Threads in the default executor")
+    parser.add_argument('--debug', action='store_true', help="asyncio debug mode: report slow callbacks")
+    parser.add_argument('--slow-callback', type=float, default=0.1, help="Slow callback threshold in seconds")
+    args = parser.parse_args()
+    
+    name = args.example or ('loop_workload' if args.ab else None)
+    if name is None:
+        print("Week 9 Python Async Examples")
+        print("Uncomment examples in __main__ to test, or run one by name:")
+        print("  python week9_python_examples.py gather_example")
+        print("  python week9_python_examples.py --ab")
+        sys.exit(0)
+    
+    example = globals().get(name)
+    if not inspect.iscoroutinefunction(example):
+        parser.error(f"{name!r} is not an example coroutine")
+    required = [
+        p.name for p in inspect.signature(example).parameters.values()
+        if p.default is p.empty and p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)
+    ]
+    if required:
+        parser.error(f"{name!r} needs arguments ({', '.join(required)}); call it from Python instead")
+    
+    options = {
+        'executor_workers': args.workers,
+        'debug': args.debug,
+        'slow_callback_duration': args.slow_callback
+    }
+    if args.ab:
+        compare_loops(example, rounds=args.rounds, **options)
+    else:
+        run(example(), use_uvloop=False if args.no_uvloop else None, **options)
\ No newline at end of file